@@ -0,0 +1,97 @@
+import argparse
+import importlib.util
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import extractors  # noqa: E402
+
+# 在 fixtures 中的模拟页面上运行各个提取器 (页面是生成的，不是网站的存档，见 fixtures/README.md)，
+# 比较整页解析、局部解析和不同解析器的耗时与内存；
+# 流式提取按 16 KB 分块送入，另外列出读到的字节数
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+FIXTURES = {
+    'chinawriter': 'chinawriter_article.html',
+    'chinawriter_sections': 'chinawriter_section.html',
+    'wizardofodds': 'wizardofodds_blog.html',
+    'zhihu': 'zhihu.html',
+}
+
+
+def available_parsers():
+    parsers = ['html.parser']
+    if importlib.util.find_spec('lxml') is not None:
+        parsers.append('lxml')
+    return parsers
+
+
+def measure(name, content, parser, partial, repeat):
+    extractors.extract(name, content, parser=parser, partial=partial)
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        items = extractors.extract(name, content, parser=parser, partial=partial)
+    seconds = (time.perf_counter() - start) / repeat
+
+    tracemalloc.start()
+    extractors.extract(name, content, parser=parser, partial=partial)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return len(items), seconds, peak
+
+
+def stream(name, content, parser, chunk_size=16384):
+    extractor = extractors.StreamExtractor(name, parser=parser)
+    received = 0
+    for i in range(0, len(content), chunk_size):
+        received += len(content[i:i + chunk_size])
+        if extractor.feed(content[i:i + chunk_size]):
+            break
+    return extractor.close(), received
+
+
+def measure_stream(name, content, parser, repeat):
+    stream(name, content, parser)
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        items, received = stream(name, content, parser)
+    seconds = (time.perf_counter() - start) / repeat
+
+    tracemalloc.start()
+    stream(name, content, parser)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return len(items), seconds, peak, received
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description='列表页提取器基准测试')
+    arg_parser.add_argument('--repeat', type=int, default=20)
+    args = arg_parser.parse_args()
+
+    print(f"{'提取器':<22}{'解析器':<13}{'模式':<9}{'条目':>6}{'耗时(ms)':>12}{'峰值内存(KB)':>16}")
+    for name, filename in FIXTURES.items():
+        with open(os.path.join(FIXTURE_DIR, filename), 'rb') as f:
+            content = f.read()
+        _, region = extractors.EXTRACTORS[name]
+        if region is None:
+            cases = [('regex', True)]
+        else:
+            cases = [(parser, partial) for parser in available_parsers() for partial in (False, True)]
+        for parser, partial in cases:
+            count, seconds, peak = measure(name, content, parser, partial, args.repeat)
+            mode = '-' if region is None else '局部' if partial else '整页'
+            print(f"{name:<22}{parser:<13}{mode:<9}{count:>6}{seconds * 1000:>12.2f}{peak / 1024:>16.1f}")
+        parser = 'regex' if region is None else extractors.PARSER
+        count, seconds, peak, received = measure_stream(name, content, parser, args.repeat)
+        print(f"{name:<22}{parser:<13}{'流式':<9}{count:>6}{seconds * 1000:>12.2f}{peak / 1024:>16.1f}"
+              f"    读取 {received / 1024:.0f}/{len(content) / 1024:.0f} KB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,182 @@
+import argparse
+import asyncio
+import functools
+import hashlib
+import os
+import statistics
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, ROOT_DIR)
+
+# 离线端到端基准：HTTP 走录制回放，Telegram 走本地替身，统计抓取/解析/去重/发送/写 RSS 各阶段耗时
+
+FIXTURE_DIR = os.path.join(BENCH_DIR, 'fixtures')
+SECTION_URLS = [
+    'https://www.chinawriter.com.cn/news/',
+    'https://www.chinawriter.com.cn/pinglun/',
+    'https://www.chinawriter.com.cn/zuopin/',
+    'https://www.chinawriter.com.cn/fangtan/',
+    'https://www.chinawriter.com.cn/wenshi/',
+    'https://www.chinawriter.com.cn/yishu/',
+    'https://www.chinawriter.com.cn/wlwx/',
+    'https://www.chinawriter.com.cn/etxx/',
+    'https://www.chinawriter.com.cn/sjwt/',
+]
+SEED_PAGES = {
+    'https://www.chinawriter.com.cn/n1/2024/0911/c403994-40317554.html': 'chinawriter_article.html',
+    'https://wizardofodds.com/blog/': 'wizardofodds_blog.html',
+    **{url: 'chinawriter_section.html' for url in SECTION_URLS},
+}
+
+STAGES = ['fetch', 'parse', 'dedupe', 'send', 'feed']
+timings = defaultdict(list)
+
+
+def timed(stage, func):
+    if asyncio.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def async_wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return await func(*args, **kwargs)
+            finally:
+                timings[stage].append(time.perf_counter() - start)
+        return async_wrapper
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            timings[stage].append(time.perf_counter() - start)
+    return wrapper
+
+
+def timed_async_iter(stage, func):
+    # 并发抓取按完成顺序产出结果，记录每个结果的等待时间
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        async for result in func(*args, **kwargs):
+            timings[stage].append(time.perf_counter() - start)
+            yield result
+            start = time.perf_counter()
+    return wrapper
+
+
+def seed_recordings():
+    import replay
+    for url, filename in SEED_PAGES.items():
+        with open(os.path.join(FIXTURE_DIR, filename), 'rb') as f:
+            body = f.read()
+        etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+        replay.save(url, 200, {'Content-Type': 'text/html; charset=utf-8', 'ETag': etag}, body)
+    print(f"已用 {FIXTURE_DIR} 中的页面生成 {len(SEED_PAGES)} 条录制")
+
+
+def instrument():
+    import extractors
+    import feed_writer
+    import fetch_engine
+    import http_cache
+    import sent_store
+    import telegram_outbox
+
+    # 流式抓取边下载边匹配，fetch 阶段包含正则提取器的匹配耗时
+    http_cache.fetch_stream = timed('fetch', http_cache.fetch_stream)
+    fetch_engine.fetch_all = timed_async_iter('fetch', fetch_engine.fetch_all)
+    extractors.extract = timed('parse', extractors.extract)
+    sent_store.SentStore.__contains__ = timed('dedupe', sent_store.SentStore.__contains__)
+    sent_store.SentStore.add = timed('dedupe', sent_store.SentStore.add)
+    telegram_outbox._send = timed('send', telegram_outbox._send)
+    feed_writer.write_feed = timed('feed', feed_writer.write_feed)
+
+
+def targets():
+    import chinawriter_rss
+    import sources
+    import wizardofodds_scraper
+    sections = sources.load_module('chinawriter_sections', 'chinawriter_rss copy.py')
+    return {
+        'chinawriter': chinawriter_rss.update_articles,
+        'sections': sections.update_rss,
+        'wizardofodds': wizardofodds_scraper.update_articles,
+    }
+
+
+def report(runs, server):
+    print()
+    print(f"{'目标':<16}{'轮次':>6}{'新条目':>8}{'耗时(ms)':>12}")
+    for name, run, new_items, seconds in runs:
+        print(f"{name:<16}{run:>6}{new_items:>8}{seconds * 1000:>12.1f}")
+
+    print()
+    print(f"{'阶段':<10}{'次数':>8}{'总计(ms)':>12}{'平均(ms)':>12}{'p50(ms)':>12}{'p95(ms)':>12}{'吞吐(次/秒)':>14}")
+    for stage in STAGES:
+        values = sorted(timings[stage])
+        if not values:
+            print(f"{stage:<10}{0:>8}")
+            continue
+        total = sum(values)
+        p95 = values[min(len(values) - 1, int(len(values) * 0.95))]
+        throughput = len(values) / total if total else float('inf')
+        print(f"{stage:<10}{len(values):>8}{total * 1000:>12.1f}{total / len(values) * 1000:>12.2f}"
+              f"{statistics.median(values) * 1000:>12.2f}{p95 * 1000:>12.2f}{throughput:>14.0f}")
+
+    print()
+    print(f"Telegram 替身: {server.stats}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='离线端到端基准测试')
+    parser.add_argument('--record', action='store_true', help='访问真实网站并录制响应，而不是回放')
+    parser.add_argument('--seed', action='store_true', help='用 benchmarks/fixtures 中的页面生成录制')
+    parser.add_argument('--runs', type=int, default=2, help='每个目标运行的轮数 (第二轮起走 304 和去重路径)')
+    parser.add_argument('--target', choices=['chinawriter', 'sections', 'wizardofodds'], action='append')
+    parser.add_argument('--latency', type=float, default=0.0, help='Telegram 替身每次调用的延迟 (秒)')
+    parser.add_argument('--fail-every', type=int, default=0, help='Telegram 替身每 N 次调用返回一次 429')
+    parser.add_argument('--real-limits', action='store_true', help='使用 Telegram 的真实速率限制')
+    args = parser.parse_args()
+
+    import fake_telegram
+    server = fake_telegram.start(latency=args.latency, fail_every=args.fail_every)
+
+    # 项目模块在导入时读取环境变量，必须先设置好再导入
+    os.environ['HTTP_REPLAY_MODE'] = 'record' if args.record else 'replay'
+    os.environ.setdefault('HTTP_REPLAY_DIR', os.path.join(BENCH_DIR, 'recordings'))
+    os.environ['TELEGRAM_API_BASE'] = server.url
+    os.environ['TELEGRAM_BOT_TOKEN'] = 'bench'
+    os.environ['TELEGRAM_CHANNEL_ID'] = '@bench'
+    if not args.real_limits:
+        os.environ['TELEGRAM_GLOBAL_RATE'] = os.environ['TELEGRAM_CHAT_RATE'] = '1000000'
+
+    if args.seed:
+        seed_recordings()
+
+    # 状态文件 (发送记录、发件箱、RSS、HTTP 缓存) 写到临时目录
+    workdir = tempfile.mkdtemp(prefix='bench_pipeline_')
+    os.chdir(workdir)
+    print(f"工作目录: {workdir}")
+
+    instrument()
+    runs = []
+    for name, func in targets().items():
+        if args.target and name not in args.target:
+            continue
+        for run in range(1, args.runs + 1):
+            start = time.perf_counter()
+            new_items = func() or 0
+            runs.append((name, run, new_items, time.perf_counter() - start))
+
+    server.shutdown()
+    report(runs, server)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import sources  # noqa: E402
+
+# 冷启动开销：每个来源在全新的解释器中导入入口模块，记录导入耗时、进程总耗时和常驻内存
+# 每次都启动新进程，模块缓存和 .pyc 之外没有任何预热
+
+# 子进程中执行：导入前后各取一次时间和 RSS 峰值 (Linux 上 ru_maxrss 单位为 KB)
+PROBE = '''
+import json, sys, time
+start = time.perf_counter()
+try:
+    import resource
+    rss = lambda: resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+except ImportError:
+    rss = lambda: float('nan')
+sys.path.insert(0, sys.argv[2])
+rss_before = rss()
+import sources
+sources.load_source(sys.argv[1])
+print(json.dumps({'import': time.perf_counter() - start, 'rss_before': rss_before, 'rss': rss(),
+                  'modules': len(sys.modules)}))
+'''
+
+
+def probe(name, cwd):
+    start = time.perf_counter()
+    output = subprocess.run([sys.executable, '-c', PROBE, name, ROOT], cwd=cwd, capture_output=True, text=True,
+                            check=True).stdout
+    result = json.loads(output.strip().splitlines()[-1])
+    result['process'] = time.perf_counter() - start
+    return result
+
+
+def baseline(cwd):
+    start = time.perf_counter()
+    subprocess.run([sys.executable, '-c', 'pass'], cwd=cwd, check=True)
+    return time.perf_counter() - start
+
+
+def import_profile(name, cwd, top):
+    # python -X importtime 的自身耗时按顶层包汇总 (如 bs4.element 计入 bs4)，不含项目自己的模块
+    code = f"import sys; sys.path.insert(0, {ROOT!r}); import sources; sources.load_source({name!r})"
+    stderr = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], cwd=cwd, capture_output=True,
+                            text=True).stderr
+    project = {os.path.splitext(f)[0] for f in os.listdir(ROOT) if f.endswith('.py')}
+    totals = {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        self_time, _, module = line[len('import time:'):].split('|')
+        package = module.strip().split('.')[0]
+        if package not in project:
+            totals[package] = totals.get(package, 0) + int(self_time)
+    return sorted(((us, package) for package, us in totals.items()), reverse=True)[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='各来源的冷启动导入耗时和内存')
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--top', type=int, default=0, help='同时列出每个来源最慢的 N 个导入')
+    parser.add_argument('--budget', type=float, default=0,
+                        help='导入耗时预算 (ms)，有来源超出时以非零状态退出，可用于 CI')
+    parser.add_argument('sources', nargs='*')
+    args = parser.parse_args()
+    names = args.sources or list(sources.SOURCES)
+
+    with tempfile.TemporaryDirectory(prefix='bench_startup_') as cwd:
+        empty = statistics.median(baseline(cwd) for _ in range(args.runs))
+        print(f"空解释器启动: {empty * 1000:.1f} ms\n")
+        print(f"{'来源':<22}{'导入(ms)':>10}{'进程(ms)':>10}{'RSS(MB)':>10}{'导入增加(MB)':>14}{'模块数':>8}")
+        over = []
+        for name in names:
+            results = [probe(name, cwd) for _ in range(args.runs)]
+            import_ms = statistics.median(r['import'] for r in results) * 1000
+            process_ms = statistics.median(r['process'] for r in results) * 1000
+            rss = statistics.median(r['rss'] for r in results)
+            added = statistics.median(r['rss'] - r['rss_before'] for r in results)
+            print(f"{name:<22}{import_ms:>10.1f}{process_ms:>10.1f}{rss:>10.1f}{added:>14.1f}"
+                  f"{results[0]['modules']:>8}")
+            if args.budget and import_ms > args.budget:
+                over.append(name)
+            if args.top:
+                for self_time, package in import_profile(name, cwd, args.top):
+                    print(f"    {package:<30}{self_time / 1000:>8.1f} ms")
+    if over:
+        print(f"\n超出 {args.budget:.0f} ms 导入预算: {', '.join(over)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,40 +1,260 @@
-import time
+import asyncio
+import difflib
 import hashlib
-from urllib.request import urlopen, Request
-from telegram.ext import Updater
+import json
+import os
+import re
+import time
+from html.parser import HTMLParser
+from urllib.parse import urlsplit
+
+import httpx
+from dotenv import load_dotenv
+
+import http_cache
+import http_transport
+import locks
+import metrics
+import routing
+import telegram_outbox
+
+# 多网页监控：流式读取页面，只对指定区域的规范化文本计算指纹，并按块比较找出变化的位置
+
+load_dotenv()
+
+CHAT_ID = os.getenv('TELEGRAM_CHANNEL_ID')
+
+CONFIG_FILE = os.getenv('MONITOR_CONFIG', 'monitor.json')
+STATE_FILE = os.getenv('MONITOR_STATE', 'monitor_state.json')
+CHECK_INTERVAL = int(os.getenv('MONITOR_INTERVAL', '30'))
+MAX_CONCURRENCY = int(os.getenv('MONITOR_MAX_CONCURRENCY', '10'))
+
+# 没有配置文件时监控的网页；配置文件 (JSON 列表) 的格式相同，例如
+# [{"url": "...", "region": {"tag": "div", "id": "main"}, "ignore": ["广告\\d+"]}]
+# region 为 None 表示整个 <body>，ignore 省略时使用 DEFAULT_IGNORE
+DEFAULT_WATCHES = [
+    {'url': 'https://www.geeksforgeeks.org', 'region': None},
+]
 
-# Telegram bot设置
-TOKEN = 'YOUR_TELEGRAM_BOT_TOKEN'
-CHAT_ID = 'YOUR_CHAT_ID'
+# 规范化时去掉的易变内容：时间、日期
+DEFAULT_IGNORE = [
+    r'\d{1,2}:\d{2}(:\d{2})?',
+    r'\d{4}[-/年.]\d{1,2}[-/月.]\d{1,2}日?',
+]
 
-def send_telegram_message(message):
-    updater = Updater(TOKEN, use_context=True)
-    updater.bot.send_message(chat_id=CHAT_ID, text=message)
+# 这些标签的内容不参与比较
+SKIP_TAGS = {'script', 'style', 'noscript', 'iframe', 'svg', 'template'}
+# 这些标签的开始和结束都视为块的边界
+BLOCK_TAGS = {
+    'address', 'article', 'aside', 'blockquote', 'br', 'dd', 'div', 'dl', 'dt', 'fieldset', 'figcaption',
+    'figure', 'footer', 'form', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'header', 'hr', 'li', 'main', 'nav',
+    'ol', 'p', 'pre', 'section', 'table', 'td', 'th', 'tr', 'ul',
+}
+VOID_TAGS = {'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'link', 'meta', 'source', 'track', 'wbr'}
+PREVIEW_LENGTH = 60
 
-# 设置要监控的URL
-url = Request('https://www.geeksforgeeks.org', headers={'User-Agent': 'Mozilla/5.0'})
 
-# 获取初始网页内容的哈希值
-response = urlopen(url).read()
-current_hash = hashlib.sha224(response).hexdigest()
+class RegionFingerprinter(HTMLParser):
+    # 增量解析：只保留当前块的文本和每个块的哈希，不缓存整页
+    # 区域的边界只看与区域同名的标签的嵌套层数；多余的 </p>、没有闭合的 <li> 等不规范的标签不影响区域范围
+    def __init__(self, region=None, ignore=None):
+        super().__init__(convert_charrefs=True)
+        self.region = region or {'tag': 'body'}
+        self.ignore = [re.compile(pattern) for pattern in (DEFAULT_IGNORE if ignore is None else ignore)]
+        # 区域开始标签的标签名和它的嵌套层数
+        self.region_tag = None
+        self.depth = 0
+        self.skip_depth = 0
+        self.finished = False
+        self.text = []
+        self.digest = hashlib.sha224()
+        self.blocks = []
+        self.previews = []
+
+    def _matches(self, tag, attrs):
+        if tag != self.region.get('tag', tag):
+            return False
+        attrs = dict(attrs)
+        if 'id' in self.region and attrs.get('id') != self.region['id']:
+            return False
+        if 'class' in self.region and self.region['class'] not in (attrs.get('class') or '').split():
+            return False
+        return True
+
+    def _flush_block(self):
+        text = ' '.join(''.join(self.text).split())
+        self.text = []
+        for pattern in self.ignore:
+            text = pattern.sub('', text)
+        text = text.strip()
+        if not text:
+            return
+        block_hash = hashlib.blake2b(text.encode('utf-8'), digest_size=8).hexdigest()
+        self.digest.update(block_hash.encode('ascii'))
+        self.blocks.append(block_hash)
+        self.previews.append(text[:PREVIEW_LENGTH])
+
+    def handle_starttag(self, tag, attrs):
+        if self.finished:
+            return
+        if not self.depth:
+            if self._matches(tag, attrs):
+                self.region_tag = tag
+                self.depth = 1
+            return
+        if tag in SKIP_TAGS:
+            self.skip_depth += 1
+        if tag in BLOCK_TAGS:
+            self._flush_block()
+        if tag == self.region_tag:
+            self.depth += 1
+
+    def handle_endtag(self, tag):
+        if not self.depth or self.finished or tag in VOID_TAGS:
+            return
+        if tag in SKIP_TAGS and self.skip_depth:
+            self.skip_depth -= 1
+        if tag in BLOCK_TAGS:
+            self._flush_block()
+        if tag != self.region_tag:
+            return
+        self.depth -= 1
+        if not self.depth:
+            # 区域结束，后面的内容不再需要
+            self._flush_block()
+            self.finished = True
+
+    def handle_data(self, data):
+        if self.depth and not self.skip_depth and not self.finished:
+            self.text.append(data)
+
+    def result(self):
+        self._flush_block()
+        return self.digest.hexdigest(), self.blocks
+
+
+def load_watches():
+    try:
+        with open(CONFIG_FILE, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return DEFAULT_WATCHES
 
-print("开始监控...")
-send_telegram_message("开始监控网站变化...")
 
-while True:
+def load_state():
     try:
-        # 每30秒检查一次
-        time.sleep(30)
-        response = urlopen(url).read()
-        new_hash = hashlib.sha224(response).hexdigest()
+        with open(STATE_FILE, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+def save_state(state):
+    tmp_path = STATE_FILE + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(state, f)
+    os.replace(tmp_path, STATE_FILE)
+
+
+def send_telegram_message(message, url=None):
+    # routes.json 中 check 的 sections 按被监控的网址匹配
+    telegram_outbox.enqueue_many(message, routing.chats('check', message, url, default=CHAT_ID), parse_mode=None)
+
+
+def describe_changes(old_blocks, new_blocks, previews):
+    # 对比两次的块哈希序列，返回变化的块数和若干变化块的开头文字
+    matcher = difflib.SequenceMatcher(a=old_blocks, b=new_blocks, autojunk=False)
+    changed = 0
+    samples = []
+    for op, a_start, a_end, b_start, b_end in matcher.get_opcodes():
+        if op == 'equal':
+            continue
+        changed += max(a_end - a_start, b_end - b_start)
+        samples.extend(previews[b_start:b_end])
+    return changed, samples[:3]
+
+
+async def fingerprint(client, watch):
+    # 流式读取并计算指纹；页面未变化 (304) 时返回 None
+    url = watch['url']
+    parser = RegionFingerprinter(watch.get('region'), watch.get('ignore'))
+    headers = {'User-Agent': 'Mozilla/5.0'}
+    headers.update(http_cache.conditional_headers(url))
+    with metrics.timer('fetch', urlsplit(url).netloc):
+        async with client.stream('GET', url, headers=headers) as response:
+            if response.status_code == 304:
+                return None
+            response.raise_for_status()
+            async for chunk in response.aiter_text():
+                parser.feed(chunk)
+                if parser.finished:
+                    break
+            # 新的指纹写入 monitor_state.json 之后才保存校验值
+            http_cache.remember(url, response.headers.get('ETag'), response.headers.get('Last-Modified'))
+    parser.close()
+    digest, blocks = parser.result()
+    return digest, blocks, parser.previews
+
+
+async def check_watch(client, semaphore, watch, state):
+    url = watch['url']
+    async with semaphore:
+        try:
+            result = await fingerprint(client, watch)
+        except (httpx.HTTPError, UnicodeDecodeError) as e:
+            print(f"检查 {url} 时发生错误: {str(e)}")
+            metrics.inc('monitor_errors_total', source=url)
+            return 0
+    if result is None:
+        return 0
+
+    digest, blocks, previews = result
+    previous = state.get(url)
+    state[url] = {'digest': digest, 'blocks': blocks, 'checked_at': time.time()}
+    if previous is None or previous['digest'] == digest:
+        return 0
+
+    changed, samples = describe_changes(previous['blocks'], blocks, previews)
+    print(f"检测到网站变化: {url}，{changed} 个块")
+    metrics.inc('monitor_changes_total', source=url)
+    message = f"检测到网站变化!\n{url}\n共 {changed} 处内容块变化"
+    if samples:
+        message += '\n\n' + '\n'.join(f"- {sample}" for sample in samples)
+    send_telegram_message(message, url)
+    return 1
+
+
+async def check_all(watches=None):
+    watches = watches or load_watches()
+    state = load_state()
+    semaphore = asyncio.Semaphore(MAX_CONCURRENCY)
+    async with http_transport.async_client(timeout=30, max_connections=MAX_CONCURRENCY) as client:
+        results = await asyncio.gather(*(check_watch(client, semaphore, watch, state) for watch in watches))
+    save_state(state)
+    http_cache.commit(watch['url'] for watch in watches)
+    await telegram_outbox.drain()
+    return sum(results)
+
+
+@locks.exclusive('check')
+@metrics.track_run('check')
+def check_for_change():
+    # 检查所有网页一次，返回发生变化的网页数
+    return asyncio.run(check_all())
+
+
+def main():
+    print("开始监控...")
+    send_telegram_message("开始监控网站变化...")
 
-        if new_hash != current_hash:
-            print("检测到网站变化!")
-            send_telegram_message("检测到网站变化!")
-            current_hash = new_hash
+    while True:
+        try:
+            check_for_change()
+        except Exception as e:
+            print(f"发生错误: {str(e)}")
+            send_telegram_message(f"监控过程中发生错误: {str(e)}")
 
-    except Exception as e:
-        print(f"发生错误: {str(e)}")
-        send_telegram_message(f"监控过程中发生错误: {str(e)}")
+        time.sleep(CHECK_INTERVAL)
 
-    time.sleep(30)
\ No newline at end of file
+if __name__ == "__main__":
+    main()
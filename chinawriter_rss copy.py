@@ -1,12 +1,24 @@
-import requests
-from bs4 import BeautifulSoup
-from feedgenerator import Rss201rev2Feed
+import asyncio
+import contextlib
 import datetime
-import schedule
 import time
 import os
-from telegram import Bot
 from dotenv import load_dotenv
+import fetch_engine
+import http_cache
+import http_transport
+import extractors
+import telegram_outbox
+import digest
+import sent_store
+import feed_writer
+import locks
+import metrics
+import paginator
+import enrich
+import fingerprint
+import routing
+from urllib.parse import urljoin
 
 # Telegram Bot Token和频道ID
 load_dotenv()
@@ -14,69 +26,129 @@ load_dotenv()
 TELEGRAM_BOT_TOKEN = os.getenv('TELEGRAM_BOT_TOKEN')
 TELEGRAM_CHANNEL_ID = os.getenv('TELEGRAM_CHANNEL_ID')
 
-bot = Bot(token=TELEGRAM_BOT_TOKEN)
-
 def fetch_articles(url):
-    response = requests.get(url)
-    soup = BeautifulSoup(response.content, 'html.parser')
-    articles = []
-    for article in soup.select('.news-list li'):  # 假设文章列表在class为news-list的ul中
-        title = article.select_one('a').text.strip()
-        link = 'https://www.zhihu.com' + article.select_one('a')['href']
-        date = article.select_one('.date').text.strip()  # 假设日期在class为date的元素中
-        articles.append({'title': title, 'link': link, 'date': date})
-    return articles
+    response = http_transport.client().get(url)
+    return parse_articles(response.content)
+
+def parse_articles(content):
+    # 假设文章列表在class为news-list的ul中，日期在class为date的元素中
+    return extractors.extract('chinawriter_sections', content)
 
 def generate_rss(articles, feed_title, feed_link, filename):
-    feed = Rss201rev2Feed(
-        title=feed_title,
-        link=feed_link,
-        description=f"RSS feed for {feed_title}",
-        language="zh-CN",
-    )
-
-    for article in articles:
-        feed.add_item(
-            title=article['title'],
-            link=article['link'],
-            pubdate=datetime.datetime.strptime(article['date'], '%Y-%m-%d'),
-            description=article['title']
-        )
-
-    with open(filename, 'w', encoding='utf-8') as f:
-        feed.write(f, 'utf-8')
-
-def send_to_telegram(article):
-    message = f"*{article['title']}*\n\n{article['link']}"
-    bot.send_message(chat_id=TELEGRAM_CHANNEL_ID, text=message, parse_mode='Markdown')
+    # 增量合并到已有的 RSS 文件，内容不变时不重写
+    return feed_writer.write_feed(articles, feed_title, feed_link, filename)
+
+def send_to_telegram(article, section=None):
+    if fingerprint.is_duplicate('chinawriter_sections', article['title'], article['link']):
+        return
+    # routes.json 可以按栏目名 (如 "新作品") 把文章分到不同的聊天
+    chat_ids = routing.chats('chinawriter_sections', article['title'], section, default=TELEGRAM_CHANNEL_ID)
+    if not chat_ids:
+        return
+    if digest.ENABLED:
+        digest.add('chinawriter_sections', '中国作家网', article['title'], article['link'], article['date'],
+                   chat_ids=chat_ids)
+        return
+    message = f"{digest.bold(article['title'])}\n\n{digest.escape_markdown(article['link'])}"
+    telegram_outbox.enqueue_many(message, chat_ids)
+
+SECTIONS = [
+    {'url': 'https://www.chinawriter.com.cn/news/', 'title': '新闻动态', 'filename': 'news.xml'},
+    {'url': 'https://www.chinawriter.com.cn/pinglun/', 'title': '评论争鸣', 'filename': 'comments.xml'},
+    {'url': 'https://www.chinawriter.com.cn/zuopin/', 'title': '新作品', 'filename': 'new_works.xml'},
+    {'url': 'https://www.chinawriter.com.cn/fangtan/', 'title': '访谈', 'filename': 'interviews.xml'},
+    {'url': 'https://www.chinawriter.com.cn/wenshi/', 'title': '文史', 'filename': 'literature_history.xml'},
+    {'url': 'https://www.chinawriter.com.cn/yishu/', 'title': '艺术', 'filename': 'arts.xml'},
+    {'url': 'https://www.chinawriter.com.cn/wlwx/', 'title': '网络文学', 'filename': 'online_literature.xml'},
+    {'url': 'https://www.chinawriter.com.cn/etxx/', 'title': '儿童文学', 'filename': 'children_literature.xml'},
+    {'url': 'https://www.chinawriter.com.cn/sjwt/', 'title': '世界文坛', 'filename': 'world_literature.xml'},
+]
+
+def section_page_url(section_url, page):
+    # 栏目分页：/news/、/news/index2.html、/news/index3.html ...
+    return section_url if page == 1 else urljoin(section_url, f'index{page}.html')
+
+async def fetch_section_page(url, client):
+    # 提前返回时关闭生成器，由 fetch_all 取消未完成的请求
+    async with contextlib.aclosing(fetch_engine.fetch_all([url], client=client)) as results:
+        async for _, content, error in results:
+            if error is not None:
+                return []
+            return parse_articles(content) if content is not None else None
+
+async def process_section(section, content, sent_articles, max_pages, client, pool):
+    try:
+        articles = parse_articles(content)
 
+        # 第一页有没发送过的文章时，继续往后翻页补抓，直到整页都是已发送过的文章
+        if max_pages > 1 and any(article['link'] not in sent_articles for article in articles):
+            pages = paginator.acrawl(lambda page: section_page_url(section['url'], page),
+                                     lambda url: fetch_section_page(url, client),
+                                     lambda link: link in sent_articles, max_pages - 1, start_page=2)
+            async for page_articles in pages:
+                articles.extend(page_articles)
+
+        # 抓取正文页补全摘要、发布日期和题图 (每篇文章只抓一次)
+        await enrich.aenrich(articles, client, pool)
+        stats = generate_rss(articles, section['title'], section['url'], section['filename'])
+        stats['sent'] = 0
+
+        # 发送尚未发送过的文章到Telegram
+        for article in articles:
+            if article['link'] not in sent_articles:
+                send_to_telegram(article, section['title'])
+                sent_articles.add(article['link'])
+                stats['sent'] += 1
+        return stats
+    except Exception as e:
+        print(f"处理 {section['title']} 时出错: {str(e)}")
+
+async def update_rss_async():
+    # 所有栏目同时抓取，哪个栏目先返回就先生成 RSS 并发送
+    sections = {section['url']: section for section in SECTIONS}
+    # 与 chinawriter_rss.py 共用同一来源的发送记录
+    sent_articles = sent_store.SentStore('chinawriter')
+    feed_stats = []
+    # 首次运行 (还没有发送记录) 只看第一页，不做补抓
+    max_pages = paginator.MAX_PAGES if sent_articles else 1
+    # 栏目首页、补抓的各页和正文页共用一个连接池，各栏目的正文解析共用一个进程池
+    with enrich.executor() as pool:
+        async with fetch_engine.async_client() as client:
+            async for url, content, error in fetch_engine.fetch_all(list(sections), client=client):
+                section = sections[url]
+                if error is not None:
+                    print(f"处理 {section['title']} 时出错: {str(error)}")
+                    continue
+                if content is None:
+                    print(f"{section['title']} 未变化，跳过")
+                    continue
+                stats = await process_section(section, content, sent_articles, max_pages, client, pool)
+                if stats:
+                    # 栏目处理成功才保存 ETag，出错的栏目下次仍然完整请求
+                    http_cache.commit([url])
+                    feed_stats.append(stats)
+
+    sent_articles.prune()
+    sent_articles.close()
+    digest.flush(chat_id=TELEGRAM_CHANNEL_ID)
+    await telegram_outbox.drain()
+
+    written = sum(1 for stats in feed_stats if stats['written'])
+    seconds = sum(stats['seconds'] for stats in feed_stats)
+    metrics.inc('scraper_new_items_total', sum(stats['sent'] for stats in feed_stats), source='chinawriter_sections')
+    print(f"RSS: 处理 {len(feed_stats)} 个栏目，重写 {written} 个文件，写入耗时 {seconds * 1000:.1f} ms")
+    return sum(stats['sent'] for stats in feed_stats)
+
+@locks.exclusive('chinawriter_sections')
+@metrics.track_run('chinawriter_sections')
 def update_rss():
-    sections = [
-        {'url': 'https://www.chinawriter.com.cn/news/', 'title': '新闻动态', 'filename': 'news.xml'},
-        {'url': 'https://www.chinawriter.com.cn/pinglun/', 'title': '评论争鸣', 'filename': 'comments.xml'},
-        {'url': 'https://www.chinawriter.com.cn/zuopin/', 'title': '新作品', 'filename': 'new_works.xml'},
-        {'url': 'https://www.chinawriter.com.cn/fangtan/', 'title': '访谈', 'filename': 'interviews.xml'},
-        {'url': 'https://www.chinawriter.com.cn/wenshi/', 'title': '文史', 'filename': 'literature_history.xml'},
-        {'url': 'https://www.chinawriter.com.cn/yishu/', 'title': '艺术', 'filename': 'arts.xml'},
-        {'url': 'https://www.chinawriter.com.cn/wlwx/', 'title': '网络文学', 'filename': 'online_literature.xml'},
-        {'url': 'https://www.chinawriter.com.cn/etxx/', 'title': '儿童文学', 'filename': 'children_literature.xml'},
-        {'url': 'https://www.chinawriter.com.cn/sjwt/', 'title': '世界文坛', 'filename': 'world_literature.xml'},
-    ]
-
-    for section in sections:
-        try:
-            articles = fetch_articles(section['url'])
-            generate_rss(articles, section['title'], section['url'], section['filename'])
-            
-            # 发送最新的5篇文章到Telegram
-            for article in articles[:5]:
-                send_to_telegram(article)
-        except Exception as e:
-            print(f"处理 {section['title']} 时出错: {str(e)}")
-    
+    sent = asyncio.run(update_rss_async())
     print(f"RSS更新完成并发送到Telegram: {datetime.datetime.now()}")
+    return sent
 
 if __name__ == "__main__":
+    import schedule
+
     # 立即运行一次
     update_rss()
 
@@ -1,11 +1,18 @@
-import requests
-from bs4 import BeautifulSoup
 import datetime
 import os
 from dotenv import load_dotenv
 import logging
-import json
-import re
+import http_cache
+import extractors
+import telegram_outbox
+import digest
+import sent_store
+import locks
+import metrics
+import feed_writer
+import enrich
+import fingerprint
+import routing
 
 # 加载环境变量
 load_dotenv()
@@ -16,30 +23,24 @@ TELEGRAM_CHANNEL_ID = os.getenv('TELEGRAM_CHANNEL_ID')
 # 设置日志记录
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
+ARTICLE_LIST_URL = 'https://www.chinawriter.com.cn/n1/2024/0911/c403994-40317554.html'  # 使用具体的文章列表页面
+# 列表页边下载边匹配，匹配到这么多篇文章后不再读取页面余下的部分；0 表示读完整页
+ARTICLE_LIMIT = int(os.getenv('CHINAWRITER_ARTICLE_LIMIT', '0'))
+
 def fetch_articles(url):
     try:
-        session = requests.Session()
         headers = {
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
             'Referer': 'https://www.chinawriter.com.cn/'
         }
-        response = session.get(url, headers=headers, timeout=10)
-        response.raise_for_status()
-        
-        content = response.text
-        articles = []
-        
-        # 使用正则表达式查找所有可能的文章链接和标题
-        pattern = r'<a[^>]*href="(/n\d+/\d+/c\d+-\d+\.html)"[^>]*>(.*?)</a>'
-        matches = re.findall(pattern, content)
-        
-        for link, title in matches:
-            full_link = 'https://www.chinawriter.com.cn' + link
-            articles.append({'title': title.strip(), 'link': full_link, 'date': '未知日期'})
+        # 使用预编译的正则表达式逐块查找文章链接和标题
+        extractor = extractors.StreamExtractor('chinawriter', limit=ARTICLE_LIMIT or None)
+        articles = http_cache.fetch_stream(url, extractor, headers=headers, timeout=10)
+        if articles is None:
+            return None
         
         if not articles:
             logging.warning(f"未在 {url} 找到任何文章")
-            logging.info(f"Page content: {content[:1000]}...")  # 打印页面内容的前1000个字符
         else:
             logging.info(f"找到 {len(articles)} 篇文章")
             for article in articles[:5]:  # 只打印前5篇文章的信息
@@ -51,50 +52,64 @@ def fetch_articles(url):
         return []
 
 def send_to_telegram(article):
-    try:
-        text = f"{article['title']}\n\n{article['link']}"
-        url = f"https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}/sendMessage"
-        params = {
-            "chat_id": TELEGRAM_CHANNEL_ID,
-            "text": text,
-            "parse_mode": "Markdown"
-        }
-        response = requests.get(url, params=params)
-        result = response.json()
-        if result.get("ok"):
-            logging.info(f"成功发送消息到 Telegram: {article['title']}")
-        else:
-            logging.error(f"发送消息到 Telegram 失败: {result}")
-    except Exception as e:
-        logging.error(f"发送消息到 Telegram 时出错: {str(e)}")
+    # 同一篇文章常以不同链接出现在多个栏目，近似重复的不再发送
+    if fingerprint.is_duplicate('chinawriter', article['title'], article['link']):
+        return
+    # 按 routes.json 找出要发往的聊天，未配置路由时只发往 TELEGRAM_CHANNEL_ID
+    chat_ids = routing.chats('chinawriter', article['title'], default=TELEGRAM_CHANNEL_ID)
+    if not chat_ids:
+        return
+    # 摘要模式下先攒起来，由 digest.flush() 合并成少量消息
+    if digest.ENABLED:
+        digest.add('chinawriter', '中国作家网', article['title'], article['link'], chat_ids=chat_ids)
+        return
+    # 消息只渲染一次，写入发件箱后由 telegram_outbox.flush() 统一按速率限制发往各个聊天
+    text = f"{digest.escape_markdown(article['title'])}\n\n{digest.escape_markdown(article['link'])}"
+    telegram_outbox.enqueue_many(text, chat_ids)
+    logging.info(f"已加入 Telegram 发件箱 ({len(chat_ids)} 个聊天): {article['title']}")
 
-def load_sent_articles():
-    try:
-        with open('sent_articles.json', 'r') as f:
-            return set(json.load(f))
-    except FileNotFoundError:
-        return set()
+def generate_rss(articles):
+    # 中国作家网的汇总 RSS (chinawriter.xml)
+    return feed_writer.write_feed(articles, '中国作家网', 'https://www.chinawriter.com.cn/zx/', 'chinawriter.xml')
 
-def save_sent_articles(sent_articles):
-    with open('sent_articles.json', 'w') as f:
-        json.dump(list(sent_articles), f)
+def load_sent_articles():
+    # 发送记录保存在 SQLite 中，首次运行时导入旧的 sent_articles.json
+    sent_articles = sent_store.SentStore('chinawriter')
+    sent_articles.migrate_json('sent_articles.json')
+    return sent_articles
 
+@locks.exclusive('chinawriter')
+@metrics.track_run('chinawriter')
 def update_articles():
     sent_articles = load_sent_articles()
-    new_sent_articles = set()
+    new_sent_articles = []
+
+    articles = fetch_articles(ARTICLE_LIST_URL)
+    if articles is None:
+        logging.info("页面未变化，无需处理")
+        sent_articles.close()
+        return 0
 
-    url = 'https://www.chinawriter.com.cn/n1/2024/0911/c403994-40317554.html'  # 使用具体的文章列表页面
-    articles = fetch_articles(url)
+    # 抓取正文页补全摘要、发布日期和题图 (每篇文章只抓一次)
+    enrich.enrich(articles)
+    generate_rss(articles)
     
     for article in articles:
         if article['link'] not in sent_articles:
             send_to_telegram(article)
-            new_sent_articles.add(article['link'])
+            sent_articles.add(article['link'])
+            new_sent_articles.append(article['link'])
     
     logging.info(f"获取到 {len(articles)} 篇文章，发送了 {len(new_sent_articles)} 篇新文章到 Telegram")
+    # 全部处理完才保存 ETag，中途出错时下次不会因为 304 跳过这一页
+    http_cache.commit([ARTICLE_LIST_URL])
 
-    sent_articles.update(new_sent_articles)
-    save_sent_articles(sent_articles)
+    metrics.inc('scraper_new_items_total', len(new_sent_articles), source='chinawriter')
+    sent_articles.prune()
+    sent_articles.close()
+    digest.flush(chat_id=TELEGRAM_CHANNEL_ID)
+    telegram_outbox.flush()
+    return len(new_sent_articles)
 
 if __name__ == "__main__":
     logging.info("脚本开始运行")
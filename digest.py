@@ -0,0 +1,135 @@
+import json
+import os
+import re
+import time
+
+import locks
+import telegram_outbox
+
+# 摘要模式：把同一来源一段时间内的新文章合并成尽量少的 Telegram 消息
+
+ENABLED = os.getenv('TELEGRAM_DIGEST', '0') == '1'
+# 同一来源的新文章最多攒多少秒再发送；0 表示每轮运行结束时发送
+WINDOW = float(os.getenv('TELEGRAM_DIGEST_WINDOW', '0'))
+PENDING_FILE = os.getenv('TELEGRAM_DIGEST_FILE', 'digest_pending.jsonl')
+
+# Telegram 单条消息的长度上限 (按 UTF-16 编码单元计)
+MESSAGE_LIMIT = 4096
+
+_MARKDOWN_SPECIAL = re.compile(r'([_*`\[])')
+# 追加和合并发送可能发生在不同进程中
+_lock = locks.FileLock(PENDING_FILE + '.lock')
+
+
+def escape_markdown(text):
+    # parse_mode=Markdown 下，实体之外的 _ * ` [ 需要转义
+    return _MARKDOWN_SPECIAL.sub(r'\\\1', text)
+
+
+def bold(text):
+    # 实体内部不能转义，粗体中的 * 换成全角星号
+    return '*' + text.replace('*', '＊') + '*'
+
+
+def _length(text):
+    return len(text.encode('utf-16-le')) // 2
+
+
+def _truncate(text, limit):
+    if _length(text) <= limit:
+        return text
+    text = text[:limit - 1]
+    while _length(text) > limit - 1:
+        # 每个字符占 1 或 2 个编码单元，按一半的超出量逐步截短
+        text = text[:len(text) - max(1, (_length(text) - limit + 2) // 2)]
+    return text + '…'
+
+
+def split_message(header, blocks, separator='\n\n'):
+    # 把若干段文字装进尽量少的消息，每条消息都以 header 开头且不超过长度上限
+    messages = []
+    current = header
+    for block in blocks:
+        block = _truncate(block, MESSAGE_LIMIT - _length(header) - _length(separator))
+        candidate = current + separator + block if current else block
+        if current != header and _length(candidate) > MESSAGE_LIMIT:
+            messages.append(current)
+            candidate = header + separator + block if header else block
+        current = candidate
+    if current != header:
+        messages.append(current)
+    return messages
+
+
+def render_item(title, link, date=None):
+    line = f"• {escape_markdown(title)}\n{escape_markdown(link)}"
+    if date:
+        line += f"\n{escape_markdown(date)}"
+    return line
+
+
+def add(source, source_title, title, link, date=None, chat_ids=None):
+    # chat_ids 为 None 时由 flush() 的 chat_id 决定发往哪里
+    record = {
+        'source': source,
+        'source_title': source_title,
+        'text': render_item(title, link, date),
+        'created': time.time(),
+    }
+    if chat_ids is not None:
+        record['chats'] = list(chat_ids)
+    with _lock, open(PENDING_FILE, 'a', encoding='utf-8') as f:
+        f.write(json.dumps(record, ensure_ascii=False) + '\n')
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def _load_pending():
+    records = []
+    try:
+        with open(PENDING_FILE, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    continue
+    except FileNotFoundError:
+        pass
+    return records
+
+
+def flush(chat_id=None, force=False):
+    # 把到期的来源合并成消息写入发件箱，返回生成的消息数
+    with _lock:
+        records = _load_pending()
+        if not records:
+            return 0
+
+        by_source = {}
+        for record in records:
+            by_source.setdefault(record['source'], []).append(record)
+
+        now = time.time()
+        remaining = []
+        count = 0
+        for source, items in by_source.items():
+            if not force and now - min(item['created'] for item in items) < WINDOW:
+                remaining.extend(items)
+                continue
+            # 按路由分发时每个聊天收到的文章不同，分别合并
+            by_chat = {}
+            for item in items:
+                for chat in item.get('chats', [chat_id]):
+                    by_chat.setdefault(chat, []).append(item)
+            for chat, chat_items in by_chat.items():
+                header = bold(f"{items[0]['source_title']} ({len(chat_items)} 篇新文章)")
+                for text in split_message(header, [item['text'] for item in chat_items]):
+                    telegram_outbox.enqueue(text, chat_id=chat)
+                    count += 1
+
+        tmp_path = PENDING_FILE + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            for record in remaining:
+                f.write(json.dumps(record, ensure_ascii=False) + '\n')
+        os.replace(tmp_path, PENDING_FILE)
+    return count
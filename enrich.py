@@ -0,0 +1,193 @@
+import logging
+import os
+import re
+import sqlite3
+import time
+from urllib.parse import urljoin
+
+import metrics
+
+# 正文补全：抓取新文章的正文页，提取摘要、发布日期和题图，结果按 URL 永久缓存
+# 全部命中缓存时不需要抓取和解析，相关模块到有未缓存的文章时才导入
+
+CACHE_DB = os.getenv('ARTICLE_CACHE_DB', 'article_cache.db')
+# 同时抓取的正文页数量
+CONCURRENCY = int(os.getenv('ENRICH_CONCURRENCY', '8'))
+# 解析正文的进程数
+PROCESSES = int(os.getenv('ENRICH_PROCESSES', str(min(4, os.cpu_count() or 1))))
+SUMMARY_LENGTH = 200
+UNKNOWN_DATE = '未知日期'
+
+# 中国作家网正文页的日期形如 2024年09月11日08:43
+_CN_DATE_RE = re.compile(r'(\d{4})年(\d{1,2})月(\d{1,2})日\s*(?:(\d{1,2}):(\d{2}))?')
+_META_DATE_KEYS = ('article:published_time', 'publishdate', 'pubdate', 'publish_date', 'date')
+
+
+def _connect(path):
+    conn = sqlite3.connect(path, timeout=30, isolation_level=None)
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('''CREATE TABLE IF NOT EXISTS articles (
+        url TEXT PRIMARY KEY,
+        summary TEXT,
+        pubdate TEXT,
+        image TEXT,
+        fetched_at REAL NOT NULL
+    )''')
+    return conn
+
+
+def _meta(soup, *keys):
+    for key in keys:
+        tag = soup.find('meta', attrs={'property': key}) or soup.find('meta', attrs={'name': key})
+        if tag and tag.get('content', '').strip():
+            return tag['content'].strip()
+    return None
+
+
+def _normalize_date(value):
+    match = _CN_DATE_RE.search(value)
+    if match:
+        year, month, day, hour, minute = match.groups()
+        text = f"{year}-{int(month):02d}-{int(day):02d}"
+        if hour:
+            text += f"T{int(hour):02d}:{minute}:00+08:00"
+        return text
+    return value
+
+
+def extract_metadata(url, content):
+    # 在子进程中运行：从正文页提取摘要、发布日期和题图
+    from bs4 import BeautifulSoup
+    soup = BeautifulSoup(content, 'html.parser')
+    for tag in soup(['script', 'style', 'noscript']):
+        tag.decompose()
+
+    summary = _meta(soup, 'og:description', 'description')
+    if not summary:
+        paragraphs = (p.get_text(' ', strip=True) for p in soup.find_all('p'))
+        summary = ' '.join(text for text in paragraphs if len(text) > 20)
+    summary = ' '.join((summary or '').split())[:SUMMARY_LENGTH] or None
+
+    pubdate = _meta(soup, *_META_DATE_KEYS)
+    if not pubdate:
+        time_tag = soup.find('time', attrs={'datetime': True})
+        pubdate = time_tag['datetime'] if time_tag else None
+    if not pubdate:
+        match = _CN_DATE_RE.search(soup.get_text(' '))
+        pubdate = match.group(0) if match else None
+    pubdate = _normalize_date(pubdate) if pubdate else None
+
+    image = _meta(soup, 'og:image', 'twitter:image')
+    if not image:
+        # 优先取正文段落中的图片，避开页头的标志图
+        img = soup.select_one('p img[src]') or soup.find('img', attrs={'src': True})
+        image = img['src'] if img else None
+    image = urljoin(url, image) if image else None
+
+    return {'summary': summary, 'pubdate': pubdate, 'image': image}
+
+
+def load_cached(conn, urls):
+    cached = {}
+    for url in urls:
+        row = conn.execute('SELECT summary, pubdate, image FROM articles WHERE url = ?', (url,)).fetchone()
+        if row is not None:
+            cached[url] = {'summary': row[0], 'pubdate': row[1], 'image': row[2]}
+    return cached
+
+
+def _apply(article, metadata):
+    if metadata.get('summary'):
+        article['description'] = metadata['summary']
+    if metadata.get('pubdate') and article.get('date') in (None, '', UNKNOWN_DATE):
+        article['date'] = metadata['pubdate']
+    if metadata.get('image'):
+        article['image'] = metadata['image']
+
+
+def _lookup(conn, articles):
+    # 返回 (去重后的链接, 已缓存的结果, 尚未缓存的链接)
+    urls = list(dict.fromkeys(article['link'] for article in articles))
+    results = load_cached(conn, urls)
+    missing = [url for url in urls if url not in results]
+    metrics.inc('enrich_cache_total', len(urls) - len(missing), result='hit')
+    metrics.inc('enrich_cache_total', len(missing), result='miss')
+    return urls, results, missing
+
+
+def executor():
+    # 一次运行中多次调用 aenrich() 时由调用方创建一个进程池传入；工作进程在第一次提交任务时才启动
+    from concurrent.futures import ProcessPoolExecutor
+    return ProcessPoolExecutor(max_workers=PROCESSES)
+
+
+async def _fetch_missing(conn, missing, results, client=None, pool=None):
+    import asyncio
+    import contextlib
+    from concurrent.futures import ProcessPoolExecutor
+
+    import fetch_engine
+
+    loop = asyncio.get_running_loop()
+    # 正文解析较耗 CPU，放到进程池中；同时仍在下载的页面不受影响
+    if pool is None:
+        context = ProcessPoolExecutor(max_workers=min(PROCESSES, len(missing)))
+    else:
+        context = contextlib.nullcontext(pool)
+    with context as pool:
+        parsing = []
+        async for url, content, error in fetch_engine.fetch_all(missing, max_per_host=CONCURRENCY,
+                                                               use_cache=False, client=client):
+            if content is None:
+                continue
+            parsing.append((url, loop.run_in_executor(pool, extract_metadata, url, content)))
+        for url, future in parsing:
+            try:
+                with metrics.timer('enrich', 'article'):
+                    results[url] = await future
+            except Exception as e:
+                logging.error(f"解析正文 {url} 时出错: {str(e)}")
+                continue
+            conn.execute('INSERT OR REPLACE INTO articles (url, summary, pubdate, image, fetched_at) '
+                         'VALUES (?, ?, ?, ?, ?)',
+                         (url, results[url]['summary'], results[url]['pubdate'], results[url]['image'],
+                          time.time()))
+
+
+def _finish(articles, urls, results, missing):
+    if missing:
+        logging.info(f"补全正文：新抓取 {len(missing)} 篇，缓存命中 {len(urls) - len(missing)} 篇")
+    for article in articles:
+        if article['link'] in results:
+            _apply(article, results[article['link']])
+    return len(missing)
+
+
+async def aenrich(articles, client=None, pool=None):
+    # 补全文章信息 (就地修改)，返回本次新抓取的正文页数
+    # client (fetch_engine.async_client()) 和 pool (executor()) 省略时每次调用各自创建
+    if not articles:
+        return 0
+    conn = _connect(CACHE_DB)
+    try:
+        urls, results, missing = _lookup(conn, articles)
+        if missing:
+            await _fetch_missing(conn, missing, results, client, pool)
+        return _finish(articles, urls, results, missing)
+    finally:
+        conn.close()
+
+
+def enrich(articles):
+    # 同步版本；全部命中缓存时不启动事件循环
+    if not articles:
+        return 0
+    conn = _connect(CACHE_DB)
+    try:
+        urls, results, missing = _lookup(conn, articles)
+        if missing:
+            import asyncio
+            asyncio.run(_fetch_missing(conn, missing, results))
+        return _finish(articles, urls, results, missing)
+    finally:
+        conn.close()
@@ -0,0 +1,239 @@
+import codecs
+import importlib.util
+import os
+import re
+from urllib.parse import urljoin
+
+import metrics
+
+# 列表页提取器：只解析文章列表所在的区域，不为整页建立完整的 DOM 树
+# bs4 导入较慢，到第一次用 BeautifulSoup 解析时才导入；正则提取器完全不需要它
+
+# 安装了 lxml 时使用更快的 lxml 解析器，也可通过 HTML_PARSER 指定
+DEFAULT_PARSER = 'lxml' if importlib.util.find_spec('lxml') else 'html.parser'
+PARSER = os.getenv('HTML_PARSER', DEFAULT_PARSER)
+
+CHINAWRITER_BASE = 'https://www.chinawriter.com.cn'
+# 文章链接形如 /n1/2024/0911/c403994-40317554.html
+CHINAWRITER_LINK_RE = re.compile(r'<a[^>]*href="(/n\d+(?:/\d+)+/c\d+-\d+\.html)"[^>]*>(.*?)</a>')
+
+# 流式提取时正则匹配跨块保留的最大字符数，单个链接标签不会超过这个长度
+MAX_CARRY = int(os.getenv('STREAM_MAX_CARRY', '4096'))
+
+EXTRACTORS = {}
+# 正则提取器的模式，提取函数接收匹配对象的列表
+PATTERNS = {}
+# 文章列表的容器 (tag, class)，流式提取时容器闭合即停止读取
+CONTAINERS = {}
+# region 是整个列表而不是单个条目时，列表中条目的 (tag, class)，流式提取按它数出 limit 个条目
+ITEMS = {}
+_strainers = {}
+
+
+def has_class(name):
+    # 局部解析时 class 属性尚未拆分成列表，按空白拆分后再匹配
+    return lambda value: bool(value) and name in value.split()
+
+
+def strain(tag=None, class_name=None):
+    # 描述要保留的区域，SoupStrainer 在第一次解析时才创建
+    return tag, class_name
+
+
+def register(name, region=None, pattern=None, container=None, items=None):
+    # 注册提取器；region 为 None 的提取器不经过 BeautifulSoup，给出 pattern 时按正则逐个匹配
+    def decorator(func):
+        EXTRACTORS[name] = (func, region)
+        if pattern is not None:
+            PATTERNS[name] = pattern
+        if container is not None:
+            CONTAINERS[name] = container
+        if items is not None:
+            ITEMS[name] = items
+        return func
+    return decorator
+
+
+def strainer(name):
+    if name not in _strainers:
+        from bs4 import SoupStrainer
+        tag, class_name = EXTRACTORS[name][1]
+        _strainers[name] = SoupStrainer(tag, class_=has_class(class_name) if class_name else None)
+    return _strainers[name]
+
+
+def parse(content, strainer=None, parser=None):
+    from bs4 import BeautifulSoup
+    return BeautifulSoup(content, parser or PARSER, parse_only=strainer)
+
+
+def _text(content):
+    if isinstance(content, bytes):
+        return content.decode('utf-8', errors='replace')
+    return content
+
+
+def extract(name, content, parser=None, partial=True):
+    # partial=False 时解析整页，仅供基准测试对比使用
+    func, region = EXTRACTORS[name]
+    with metrics.timer('parse', name):
+        if name in PATTERNS:
+            items = func(list(PATTERNS[name].finditer(_text(content))))
+        elif region is None:
+            items = func(content)
+        else:
+            items = func(parse(content, strainer(name) if partial else None, parser))
+    metrics.inc('scraper_items_parsed_total', len(items), source=name)
+    return items
+
+
+def _class_tag_re(tag, class_name):
+    # 匹配带有指定 class 的开始标签；在原始字节上匹配，标签都是 ASCII，不需要先解码
+    tag = re.escape(tag).encode() if tag else rb'[a-zA-Z][\w-]*'
+    if not class_name:
+        return re.compile(rb'<' + tag + rb'\b', re.I)
+    name = re.escape(class_name).encode()
+    return re.compile(rb'<' + tag + rb'\b[^>]*\bclass\s*=\s*["\']?[^"\'>]*(?<![\w-])' + name + rb'(?![\w-])', re.I)
+
+
+class StreamExtractor:
+    # 边下载边提取：每收到一块调用 feed()，返回 True 表示已经读够，可以关闭连接；最后由 close() 取得条目。
+    # 正则提取器逐块匹配，没匹配完的结尾留到下一块；bs4 提取器逐块扫描标签，
+    # 列表容器闭合或已经收到 limit 个条目后停止，只解析收到的部分。
+    def __init__(self, name, limit=None, parser=None):
+        self.name = name
+        self.limit = limit
+        self.parser = parser
+        self.done = False
+        self.items = []
+        self._data = bytearray()
+        self._scanned = 0
+        self._end = None
+        func, region = EXTRACTORS[name]
+        if name in PATTERNS:
+            self._decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+            self._carry = ''
+            return
+        self._item_re = None
+        # 条目按 ITEMS 计数时，只从 region (列表本身) 的开始标签之后数起，页面其他地方的同名标签不算
+        self._scope_re = None
+        if limit and region:
+            if name in ITEMS:
+                self._item_re = _class_tag_re(*ITEMS[name])
+                self._scope_re = _class_tag_re(*region)
+            else:
+                self._item_re = _class_tag_re(*region)
+        self._count = 0
+        container = CONTAINERS.get(name)
+        self._container_re = _class_tag_re(*container) if container else None
+        self._tag_re = re.compile(rb'</?' + re.escape(container[0]).encode() + rb'\b', re.I) if container else None
+        # None 表示还没有进入容器
+        self._depth = None
+
+    def feed(self, chunk):
+        if self.done:
+            return True
+        if self.name in PATTERNS:
+            self._match(self._decoder.decode(chunk))
+        else:
+            self._data += chunk
+            self._scan()
+        return self.done
+
+    def _match(self, text):
+        buffer = self._carry + text
+        matches = list(PATTERNS[self.name].finditer(buffer))
+        self.items.extend(EXTRACTORS[self.name][0](matches))
+        last_end = matches[-1].end() if matches else 0
+        # 完整的匹配不会因为后面的内容而改变，只需保留最后一个匹配之后的部分
+        self._carry = buffer[max(last_end, len(buffer) - MAX_CARRY):]
+        if self.limit and len(self.items) >= self.limit:
+            del self.items[self.limit:]
+            self.done = True
+
+    def _scan(self):
+        data = self._data
+        # 最后一个 '<' 之后的标签可能还不完整，留到下一块再扫描
+        stop = data.rfind(b'<', self._scanned)
+        if stop == -1:
+            self._scanned = len(data)
+            return
+        start = self._scanned
+        self._scanned = stop
+        if self._container_re is not None and self._depth is None:
+            match = self._container_re.search(data, start, stop)
+            if match is None:
+                return
+            start = match.start()
+            self._depth = 0
+        end = stop
+        if self._tag_re is not None:
+            for match in self._tag_re.finditer(data, start, stop):
+                self._depth += -1 if match.group().startswith(b'</') else 1
+                if self._depth == 0:
+                    end = self._end = match.start()
+                    self.done = True
+                    break
+        if self._scope_re is not None:
+            match = self._scope_re.search(data, start, end)
+            if match is None:
+                return
+            start = match.end()
+            self._scope_re = None
+        if self._item_re is not None:
+            for match in self._item_re.finditer(data, start, end):
+                self._count += 1
+                if self._count > self.limit:
+                    # 从多出来的这个条目处截断，已收到的 limit 个条目都是完整的
+                    self._end = match.start()
+                    self.done = True
+                    break
+
+    def close(self):
+        if self.name not in PATTERNS:
+            return extract(self.name, bytes(self._data[:self._end]), self.parser)
+        if not self.done:
+            self._match(self._decoder.decode(b'', final=True))
+        metrics.inc('scraper_items_parsed_total', len(self.items), source=self.name)
+        return self.items
+
+
+@register('chinawriter', pattern=CHINAWRITER_LINK_RE)
+def extract_chinawriter(matches):
+    # 中国作家网的文章链接格式固定，直接用预编译的正则匹配
+    return [{'title': match.group(2).strip(), 'link': CHINAWRITER_BASE + match.group(1), 'date': '未知日期'}
+            for match in matches]
+
+
+@register('chinawriter_sections', strain(class_name='news-list'), items=strain('li'))
+def extract_chinawriter_sections(soup):
+    articles = []
+    for article in soup.select('.news-list li'):
+        title = article.select_one('a').text.strip()
+        link = urljoin(CHINAWRITER_BASE, article.select_one('a')['href'])
+        date = article.select_one('.date').text.strip()
+        articles.append({'title': title, 'link': link, 'date': date})
+    return articles
+
+
+@register('wizardofodds', strain('article', 'post'), container=strain('main', 'content'))
+def extract_wizardofodds(soup):
+    articles = []
+    for article in soup.find_all('article', class_='post'):
+        title = article.find('h2', class_='entry-title').text.strip()
+        link = article.find('a', class_='entry-title-link')['href']
+        date = article.find('time', class_='entry-time')['datetime']
+        articles.append({'title': title, 'link': link, 'date': date})
+    return articles
+
+
+@register('zhihu', strain(class_name='ContentItem'), container=strain('div', 'Topstory-recommend'))
+def extract_zhihu(soup):
+    updates = []
+    for item in soup.select('.ContentItem'):
+        title = item.select_one('.ContentItem-title').text.strip()
+        link = item.select_one('a')['href']
+        if not link.startswith('http'):
+            link = 'https://www.zhihu.com' + link
+        updates.append({'title': title, 'link': link})
+    return updates
@@ -0,0 +1,122 @@
+import argparse
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+# 本地的 Telegram Bot API 替身：接受 sendMessage，可注入延迟和 429，并统计调用次数
+# 把 TELEGRAM_API_BASE 指向它即可离线测试发件箱
+
+SEND_MESSAGE_RE = re.compile(r'^/bot[^/]+/sendMessage$')
+
+
+class FakeTelegramServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, latency=0.0, fail_every=0, retry_after=1):
+        super().__init__(address, FakeTelegramHandler)
+        self.latency = latency
+        self.fail_every = fail_every
+        self.retry_after = retry_after
+        self.lock = threading.Lock()
+        self.stats = {'calls': 0, 'ok': 0, 'rate_limited': 0}
+        self.messages = []
+        self.latencies = []
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def handle_send(self, params):
+        with self.lock:
+            self.stats['calls'] += 1
+            calls = self.stats['calls']
+        if self.latency:
+            time.sleep(self.latency)
+        with self.lock:
+            if self.fail_every and calls % self.fail_every == 0:
+                self.stats['rate_limited'] += 1
+                return 429, {
+                    'ok': False,
+                    'error_code': 429,
+                    'description': f"Too Many Requests: retry after {self.retry_after}",
+                    'parameters': {'retry_after': self.retry_after},
+                }
+            self.stats['ok'] += 1
+            self.messages.append(params)
+            message_id = len(self.messages)
+        return 200, {
+            'ok': True,
+            'result': {'message_id': message_id, 'chat': {'id': params.get('chat_id')},
+                       'date': int(time.time()), 'text': params.get('text')},
+        }
+
+
+class FakeTelegramHandler(BaseHTTPRequestHandler):
+    def _params(self):
+        url = urlsplit(self.path)
+        params = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        length = int(self.headers.get('Content-Length') or 0)
+        if length:
+            body = self.rfile.read(length)
+            if 'json' in (self.headers.get('Content-Type') or ''):
+                params.update(json.loads(body))
+            else:
+                params.update({key: values[-1] for key, values in parse_qs(body.decode('utf-8')).items()})
+        return url.path, params
+
+    def _reply(self, status, payload):
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _handle(self):
+        path, params = self._params()
+        if path == '/stats':
+            with self.server.lock:
+                self._reply(200, self.server.stats)
+            return
+        if not SEND_MESSAGE_RE.match(path):
+            self._reply(404, {'ok': False, 'error_code': 404, 'description': 'Not Found'})
+            return
+        started = time.perf_counter()
+        status, payload = self.server.handle_send(params)
+        with self.server.lock:
+            self.server.latencies.append(time.perf_counter() - started)
+        self._reply(status, payload)
+
+    do_GET = _handle
+    do_POST = _handle
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start(host='127.0.0.1', port=0, latency=0.0, fail_every=0, retry_after=1):
+    # 在后台线程中启动，port=0 时自动选择空闲端口
+    server = FakeTelegramServer((host, port), latency, fail_every, retry_after)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='本地 Telegram Bot API 替身')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8081)
+    parser.add_argument('--latency', type=float, default=0.0, help='每次 sendMessage 的延迟 (秒)')
+    parser.add_argument('--fail-every', type=int, default=0, help='每 N 次调用返回一次 429')
+    parser.add_argument('--retry-after', type=int, default=1)
+    args = parser.parse_args()
+
+    server = FakeTelegramServer((args.host, args.port), args.latency, args.fail_every, args.retry_after)
+    print(f"Telegram 替身已启动: {server.url} (TELEGRAM_API_BASE={server.url})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print(f"统计: {server.stats}")
@@ -0,0 +1,211 @@
+import argparse
+import asyncio
+import email.utils
+import gzip
+import hashlib
+import logging
+import os
+from urllib.parse import unquote, urlsplit
+
+import metrics
+
+# RSS 文件服务：常驻内存的原始和 gzip 压缩内容、基于内容哈希的强 ETag、条件请求返回 304
+# 每次请求先 stat 文件，修改时间或大小变化时重新加载，feed_writer 写入新内容后立即生效
+
+FEED_DIR = os.getenv('FEED_DIR', '.')
+PORT = int(os.getenv('FEED_SERVER_PORT', '0'))
+HOST = os.getenv('FEED_SERVER_HOST', '127.0.0.1')
+# 允许阅读器缓存的秒数，期间内阅读器可以不发请求
+MAX_AGE = int(os.getenv('FEED_SERVER_MAX_AGE', '60'))
+# 长连接空闲多少秒后关闭
+KEEPALIVE_TIMEOUT = float(os.getenv('FEED_SERVER_KEEPALIVE', '15'))
+MAX_HEADER_SIZE = 16 * 1024
+
+_REASONS = {200: 'OK', 304: 'Not Modified', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed'}
+
+
+def accepts_gzip(accept_encoding):
+    # 按 Accept-Encoding 的 q 值判断：gzip;q=0 表示不接受；没有列出 gzip 时以 * 为准
+    qualities = {}
+    for item in accept_encoding.split(','):
+        coding, _, params = item.partition(';')
+        quality = 1.0
+        for param in params.split(';'):
+            name, _, value = param.partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        qualities[coding.strip().lower()] = quality
+    return qualities.get('gzip', qualities.get('x-gzip', qualities.get('*', 0.0))) > 0
+
+
+class Feed:
+    def __init__(self, path):
+        self.path = path
+        self.stat_key = None
+        self.reload()
+
+    def reload(self):
+        stat = os.stat(self.path)
+        with open(self.path, 'rb') as f:
+            body = f.read()
+        self.stat_key = (stat.st_mtime_ns, stat.st_size)
+        self.body = body
+        self.gzip_body = gzip.compress(body, compresslevel=9, mtime=0)
+        digest = hashlib.sha256(body).hexdigest()[:32]
+        # 不同编码的表示是不同的字节序列，强 ETag 也要区分
+        self.etag = f'"{digest}"'
+        self.gzip_etag = f'"{digest}-gz"'
+        self.last_modified = email.utils.formatdate(stat.st_mtime, usegmt=True)
+        logging.info(f"已加载 {os.path.basename(self.path)}: {len(body)} 字节，gzip 后 {len(self.gzip_body)} 字节")
+
+    def refresh(self):
+        # 文件变化时重新加载；返回 False 表示文件已被删除
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return False
+        if (stat.st_mtime_ns, stat.st_size) != self.stat_key:
+            self.reload()
+        return True
+
+    def not_modified(self, headers):
+        if_none_match = headers.get('if-none-match')
+        if if_none_match is not None:
+            tags = {tag.strip().removeprefix('W/') for tag in if_none_match.split(',')}
+            return '*' in tags or self.etag in tags or self.gzip_etag in tags
+        if_modified_since = headers.get('if-modified-since')
+        if if_modified_since:
+            try:
+                since = email.utils.parsedate_to_datetime(if_modified_since)
+            except (TypeError, ValueError):
+                return False
+            return email.utils.parsedate_to_datetime(self.last_modified) <= since
+        return False
+
+
+class FeedServer:
+    def __init__(self, feed_dir=FEED_DIR, max_age=MAX_AGE):
+        self.feed_dir = feed_dir
+        self.max_age = max_age
+        self.feeds = {}
+        self.server = None
+
+    def feed(self, name):
+        # 只提供目录下已有的 .xml 文件，不接受子路径
+        if not name.endswith('.xml') or name != os.path.basename(name):
+            return None
+        feed = self.feeds.get(name)
+        if feed is not None:
+            if feed.refresh():
+                return feed
+            del self.feeds[name]
+            return None
+        path = os.path.join(self.feed_dir, name)
+        # 大小写不敏感的文件系统上 News.xml 也能打开，只接受与目录中的文件名完全相同的名字
+        if not os.path.isfile(path) or name not in os.listdir(self.feed_dir):
+            return None
+        feed = self.feeds[name] = Feed(path)
+        return feed
+
+    def index(self):
+        names = sorted(name for name in os.listdir(self.feed_dir) if name.endswith('.xml'))
+        return ''.join(f"/{name}\n" for name in names).encode('utf-8')
+
+    def respond(self, method, target, headers):
+        # 返回 (状态码, 响应头, 响应体, 指标标签)；标签只取已有 RSS 文件的文件名，任意路径不会撑大指标
+        if method not in ('GET', 'HEAD'):
+            return 405, {'Allow': 'GET, HEAD'}, b'', 'other'
+        path = unquote(urlsplit(target).path)
+        if path == '/':
+            return 200, {'Content-Type': 'text/plain; charset=utf-8'}, self.index(), 'index'
+        name = path.lstrip('/')
+        feed = self.feed(name)
+        if feed is None:
+            return 404, {'Content-Type': 'text/plain; charset=utf-8'}, b'not found\n', 'other'
+
+        use_gzip = accepts_gzip(headers.get('accept-encoding', ''))
+        response_headers = {
+            'Content-Type': 'application/rss+xml; charset=utf-8',
+            'ETag': feed.gzip_etag if use_gzip else feed.etag,
+            'Last-Modified': feed.last_modified,
+            'Cache-Control': f'public, max-age={self.max_age}',
+            'Vary': 'Accept-Encoding',
+        }
+        if feed.not_modified(headers):
+            return 304, response_headers, b'', name
+        if use_gzip:
+            response_headers['Content-Encoding'] = 'gzip'
+            return 200, response_headers, feed.gzip_body, name
+        return 200, response_headers, feed.body, name
+
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                try:
+                    head = await asyncio.wait_for(reader.readuntil(b'\r\n\r\n'), KEEPALIVE_TIMEOUT)
+                except (asyncio.TimeoutError, asyncio.IncompleteReadError, asyncio.LimitOverrunError,
+                        ConnectionError):
+                    return
+                lines = head.decode('latin-1').split('\r\n')
+                try:
+                    method, target, version = lines[0].split(' ', 2)
+                except ValueError:
+                    await self._write(writer, 'HTTP/1.1', 400, {}, b'', False)
+                    return
+                headers = {}
+                for line in lines[1:]:
+                    if ':' in line:
+                        name, value = line.split(':', 1)
+                        headers[name.strip().lower()] = value.strip()
+
+                status, response_headers, body, feed_label = self.respond(method, target, headers)
+                metrics.inc('feed_server_requests_total', feed=feed_label, status=status)
+                connection = headers.get('connection', '').lower()
+                keep_alive = connection == 'keep-alive' if version == 'HTTP/1.0' else connection != 'close'
+                await self._write(writer, version, status, response_headers, b'' if method == 'HEAD' else body,
+                                  keep_alive, len(body))
+                if not keep_alive:
+                    return
+        finally:
+            writer.close()
+
+    async def _write(self, writer, version, status, headers, body, keep_alive, length=None):
+        lines = [f"{version if version in ('HTTP/1.0', 'HTTP/1.1') else 'HTTP/1.1'} {status} {_REASONS[status]}"]
+        headers = dict(headers)
+        if status != 304:
+            headers['Content-Length'] = str(len(body) if length is None else length)
+        headers['Connection'] = 'keep-alive' if keep_alive else 'close'
+        lines.extend(f"{name}: {value}" for name, value in headers.items())
+        writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1') + body)
+        await writer.drain()
+
+    async def start(self, port=PORT, host=HOST):
+        self.server = await asyncio.start_server(self.handle, host, port, limit=MAX_HEADER_SIZE)
+        port = self.server.sockets[0].getsockname()[1]
+        logging.info(f"RSS 服务已启动: http://{host}:{port}/")
+        return self.server
+
+
+async def start(port=PORT, host=HOST, feed_dir=FEED_DIR):
+    server = FeedServer(feed_dir)
+    await server.start(port, host)
+    return server
+
+
+async def _serve_forever(port, host, feed_dir):
+    server = await start(port, host, feed_dir)
+    async with server.server:
+        await server.server.serve_forever()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description='提供生成的 RSS 文件')
+    parser.add_argument('--port', type=int, default=PORT or 8080)
+    parser.add_argument('--host', default=HOST)
+    parser.add_argument('--dir', default=FEED_DIR)
+    args = parser.parse_args()
+    asyncio.run(_serve_forever(args.port, args.host, args.dir))
@@ -0,0 +1,155 @@
+import datetime
+import email.utils
+import hashlib
+import json
+import logging
+import mimetypes
+import os
+import time
+import xml.etree.ElementTree as ET
+
+import metrics
+
+# 每个 RSS 文件最多保留的条目数
+MAX_ITEMS = int(os.getenv('FEED_MAX_ITEMS', '100'))
+
+
+# 没有时区的日期 (如 meta 标签中的 '2024-09-10') 按北京时间处理
+DEFAULT_TZ = datetime.timezone(datetime.timedelta(hours=8))
+
+
+def _parse_date(value):
+    # 兼容 '2024-09-11'、ISO 8601 和 RSS 的 RFC 2822 日期，无法识别时返回 None
+    # 返回值总是带时区的，feedgenerator 比较带时区和不带时区的日期时会出错
+    if not value:
+        return None
+    if isinstance(value, datetime.datetime):
+        date = value
+    else:
+        try:
+            date = datetime.datetime.fromisoformat(value)
+        except ValueError:
+            try:
+                date = email.utils.parsedate_to_datetime(value)
+            except (TypeError, ValueError):
+                return None
+    if date.tzinfo is None:
+        date = date.replace(tzinfo=DEFAULT_TZ)
+    return date
+
+
+def _canonical(item):
+    pubdate = _parse_date(item.get('pubdate') or item.get('date'))
+    return {
+        'title': item.get('title') or '',
+        'link': item['link'],
+        'description': item.get('description') or item.get('title') or '',
+        'pubdate': pubdate.isoformat() if pubdate else None,
+        'image': item.get('image'),
+    }
+
+
+def read_feed(filename):
+    # 读取已有 RSS 文件中的频道信息和条目，文件不存在或损坏时视为空
+    try:
+        root = ET.parse(filename).getroot()
+    except (FileNotFoundError, ET.ParseError):
+        return None, []
+    channel = root.find('channel')
+    if channel is None:
+        return None, []
+    meta = {'title': channel.findtext('title'), 'link': channel.findtext('link')}
+    items = []
+    for element in channel.findall('item'):
+        link = element.findtext('link')
+        if not link:
+            continue
+        enclosure = element.find('enclosure')
+        items.append(_canonical({
+            'title': element.findtext('title'),
+            'link': link,
+            'description': element.findtext('description'),
+            'pubdate': element.findtext('pubDate'),
+            'image': enclosure.get('url') if enclosure is not None else None,
+        }))
+    return meta, items
+
+
+def merge_items(new_items, old_items, max_items=MAX_ITEMS):
+    # 以链接为键合并：本次抓到的条目在前，旧条目在后，超出窗口的最旧条目被丢弃
+    merged = {}
+    for item in new_items:
+        if item['link'] not in merged:
+            merged[item['link']] = item
+    for item in old_items:
+        current = merged.get(item['link'])
+        if current is None:
+            merged[item['link']] = item
+        else:
+            # 本次抓取缺少的信息沿用旧条目中的
+            for field in ('pubdate', 'image'):
+                if not current[field]:
+                    current[field] = item[field]
+    return list(merged.values())[:max_items]
+
+
+def _content_hash(meta, items):
+    return hashlib.sha256(json.dumps([meta, items], ensure_ascii=False, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def _render(meta, items, filename):
+    # 只有内容变化时才需要 feedgenerator
+    from feedgenerator import Enclosure, Rss201rev2Feed
+
+    feed = Rss201rev2Feed(
+        title=meta['title'],
+        link=meta['link'],
+        description=f"RSS feed for {meta['title']}",
+        language="zh-CN",
+    )
+    for item in items:
+        enclosures = None
+        if item['image']:
+            mime_type = mimetypes.guess_type(item['image'])[0] or 'image/jpeg'
+            enclosures = [Enclosure(item['image'], '0', mime_type)]
+        feed.add_item(
+            title=item['title'],
+            link=item['link'],
+            pubdate=_parse_date(item['pubdate']),
+            description=item['description'],
+            enclosures=enclosures,
+        )
+
+    # 先写临时文件再替换，读者不会读到写了一半的文件
+    tmp_path = filename + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        feed.write(f, 'utf-8')
+    os.replace(tmp_path, filename)
+
+
+def write_feed(articles, feed_title, feed_link, filename, max_items=MAX_ITEMS):
+    # 把新条目合并进已有 RSS，仅在内容变化时重写文件；返回本次写入的统计信息
+    start = time.perf_counter()
+    meta = {'title': feed_title, 'link': feed_link}
+    old_meta, old_items = read_feed(filename)
+    new_items = [_canonical(article) for article in articles]
+    items = merge_items(new_items, old_items, max_items)
+
+    old_links = {item['link'] for item in old_items}
+    added = sum(1 for item in items if item['link'] not in old_links)
+    changed = _content_hash(meta, items) != _content_hash(old_meta, old_items)
+    if changed:
+        _render(meta, items, filename)
+
+    stats = {
+        'filename': filename,
+        'items': len(items),
+        'added': added,
+        'written': changed,
+        'seconds': time.perf_counter() - start,
+    }
+    metrics.observe('scraper_stage_seconds', stats['seconds'], stage='feed', source=filename)
+    metrics.inc('feed_writes_total', source=filename, result='written' if changed else 'unchanged')
+    logging.info(f"{filename}: {stats['items']} 个条目，新增 {added} 个，"
+                 f"{'已更新' if changed else '未变化'}，耗时 {stats['seconds'] * 1000:.1f} ms")
+    return stats
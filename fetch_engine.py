@@ -0,0 +1,69 @@
+import asyncio
+import contextlib
+import logging
+import os
+from urllib.parse import urlsplit
+
+import httpx
+
+import http_cache
+import http_transport
+import metrics
+
+# 每个主机同时进行的请求数上限
+MAX_PER_HOST = int(os.getenv('FETCH_MAX_PER_HOST', '4'))
+# 整个连接池的连接数上限
+MAX_CONNECTIONS = int(os.getenv('FETCH_MAX_CONNECTIONS', '20'))
+
+
+def _host(url):
+    return urlsplit(url).netloc
+
+
+def async_client(headers=None, timeout=10):
+    # 供多次调用 fetch_all() 的调用方在整次运行中共用
+    return http_transport.async_client(headers=headers, timeout=timeout, max_connections=MAX_CONNECTIONS)
+
+
+async def fetch_all(urls, headers=None, timeout=10, max_per_host=MAX_PER_HOST, use_cache=True, client=None):
+    # 并发抓取所有 URL，按完成顺序逐个产出 (url, content, error)
+    # 启用缓存时发送条件请求，页面未变化 (304) 的 URL 产出 content 和 error 均为 None；
+    # 校验值由调用方在处理成功后用 http_cache.commit() 保存
+    # 所有请求共用一个连接池，同一主机的并发数受 max_per_host 限制；
+    # 一次运行中多次调用时由调用方传入 client (见 async_client())，连接和 TLS 会话在各次调用之间复用，
+    # 此时 headers 和 timeout 以 client 为准
+    semaphores = {}
+
+    if client is None:
+        context = async_client(headers=headers, timeout=timeout)
+    else:
+        context = contextlib.nullcontext(client)
+    async with context as client:
+
+        async def fetch_one(url):
+            semaphore = semaphores.setdefault(_host(url), asyncio.Semaphore(max_per_host))
+            async with semaphore:
+                try:
+                    request_headers = http_cache.conditional_headers(url) if use_cache else {}
+                    with metrics.timer('fetch', _host(url)):
+                        response = await client.get(url, headers=request_headers)
+                    metrics.inc('scraper_http_responses_total', source=_host(url), status=response.status_code)
+                    if response.status_code == 304:
+                        return url, None, None
+                    response.raise_for_status()
+                    if use_cache:
+                        http_cache.remember(url, response.headers.get('ETag'), response.headers.get('Last-Modified'))
+                    return url, response.content, None
+                except httpx.HTTPError as e:
+                    metrics.inc('scraper_http_errors_total', source=_host(url))
+                    logging.error(f"抓取 {url} 时出错: {str(e)}")
+                    return url, None, e
+
+        tasks = [asyncio.create_task(fetch_one(url)) for url in urls]
+        try:
+            for future in asyncio.as_completed(tasks):
+                yield await future
+        finally:
+            # 调用方提前退出时取消尚未完成的请求
+            for task in tasks:
+                task.cancel()
@@ -0,0 +1,206 @@
+import hashlib
+import logging
+import os
+import random
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from array import array
+from urllib.parse import urlsplit
+
+import metrics
+import sent_store
+
+# 跨来源的近似重复检测：对规范化后的标题和 URL 路径中的单词计算 MinHash 签名，
+# 估计的 Jaccard 相似度不低于 THRESHOLD、且标题中的数字完全相同的视为同一篇文章。
+# "2024年…" 和 "2025年…"、"第十届" 和 "第十一届" 只差一两个字，但是不同的文章。
+# 签名按 LSH 分段，每段的哈希存入带索引的表，查询时只比较至少有一段相同的候选，
+# 不必扫描全部历史。标题很短，SimHash 的位差对一两个字的改动过于敏感，所以用 MinHash。
+
+DB_FILE = os.getenv('FINGERPRINT_DB', sent_store.DB_FILE)
+# 最多保留的指纹数，超出后淘汰最旧的
+MAX_ITEMS = int(os.getenv('FINGERPRINT_MAX_ITEMS', '20000'))
+THRESHOLD = float(os.getenv('FINGERPRINT_THRESHOLD', '0.9'))
+# 只和最近这么多天内记录的指纹比较，去年的文章不会挡住今年的同名文章
+WINDOW_DAYS = float(os.getenv('FINGERPRINT_WINDOW_DAYS', '30'))
+
+# 64 个哈希分成 16 段、每段 4 个：相似度 0.9 的两篇文章成为候选的概率超过 99.9%，0.3 的约 12%
+NUM_HASHES = 64
+BANDS = 16
+ROWS = NUM_HASHES // BANDS
+# 每新增这么多条指纹检查一次是否超出上限
+PRUNE_EVERY = 100
+
+_PRIME = (1 << 61) - 1
+_MASK = (1 << 32) - 1
+_random = random.Random(20240911)
+# 固定种子，签名在不同进程、不同次运行之间可以比较
+_PERMUTATIONS = [(_random.randrange(1, _PRIME), _random.randrange(0, _PRIME)) for _ in range(NUM_HASHES)]
+
+_TOKEN_RE = re.compile(r'[㐀-鿿]|[a-z0-9]+')
+# URL 路径只取英文单词 (如 /blog/blackjack-side-bets/)；日期和编号在转载时会变，不参与比较
+_PATH_WORD_RE = re.compile(r'[a-z]{3,}')
+# 阿拉伯数字和中文数字 (一、十一、二〇二四 ...)
+_NUMBER_RE = re.compile(r'[0-9]+|[零〇一二三四五六七八九十百千万两]+')
+_PATH_STOPWORDS = {'html', 'htm', 'shtml', 'php', 'aspx', 'index', 'www', 'blog', 'news', 'article', 'page'}
+
+
+def _connect(path):
+    conn = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('''CREATE TABLE IF NOT EXISTS fingerprints (
+        id INTEGER PRIMARY KEY,
+        signature BLOB NOT NULL,
+        source TEXT NOT NULL,
+        link TEXT NOT NULL,
+        seen_at REAL NOT NULL,
+        numbers TEXT
+    )''')
+    columns = {row[1] for row in conn.execute('PRAGMA table_info(fingerprints)')}
+    if 'numbers' not in columns:
+        # 旧版本的指纹没有记录数字，numbers 为 NULL 的旧指纹不再参与匹配
+        conn.execute('ALTER TABLE fingerprints ADD COLUMN numbers TEXT')
+    conn.execute('''CREATE TABLE IF NOT EXISTS fingerprint_bands (
+        band INTEGER NOT NULL,
+        bucket INTEGER NOT NULL,
+        id INTEGER NOT NULL,
+        PRIMARY KEY (band, bucket, id)
+    ) WITHOUT ROWID''')
+    conn.execute('CREATE INDEX IF NOT EXISTS fingerprint_bands_id ON fingerprint_bands (id)')
+    conn.execute('CREATE INDEX IF NOT EXISTS fingerprints_seen_at ON fingerprints (seen_at)')
+    return conn
+
+
+def normalize_title(title):
+    # 全角转半角、统一小写；标点和空白在切词时丢弃
+    return unicodedata.normalize('NFKC', title or '').lower()
+
+
+def shingles(title, link):
+    # 标题按汉字和英文单词切分后取相邻两词，再加上 URL 路径中的英文单词
+    tokens = _TOKEN_RE.findall(normalize_title(title))
+    result = {' '.join(tokens[i:i + 2]) for i in range(max(1, len(tokens) - 1))} if tokens else set()
+    result.update('/' + word for word in _PATH_WORD_RE.findall(urlsplit(link or '').path.lower())
+                  if word not in _PATH_STOPWORDS)
+    return result
+
+
+def numbers(title):
+    # 标题中按顺序出现的数字，近似重复的两篇文章必须完全相同
+    return ' '.join(_NUMBER_RE.findall(normalize_title(title)))
+
+
+def signature(title, link):
+    values = [int.from_bytes(hashlib.blake2b(shingle.encode('utf-8'), digest_size=8).digest(), 'big')
+              for shingle in shingles(title, link)]
+    if not values:
+        return None
+    return array('I', (min((a * value + b) % _PRIME for value in values) & _MASK for a, b in _PERMUTATIONS))
+
+
+def _buckets(sig):
+    # 每段的 4 个值合成一个有符号 64 位整数 (SQLite 的 INTEGER)
+    buckets = []
+    for band in range(BANDS):
+        digest = hashlib.blake2b(sig[band * ROWS:(band + 1) * ROWS].tobytes(), digest_size=8).digest()
+        buckets.append(int.from_bytes(digest, 'big', signed=True))
+    return buckets
+
+
+def similarity(a, b):
+    return sum(x == y for x, y in zip(a, b)) / NUM_HASHES
+
+
+class FingerprintIndex:
+    def __init__(self, path=DB_FILE, max_items=MAX_ITEMS, threshold=THRESHOLD, window_days=WINDOW_DAYS):
+        self.max_items = max_items
+        self.threshold = threshold
+        self.window = window_days * 86400
+        self.added = 0
+        self.conn = _connect(path)
+
+    def find(self, sig, title_numbers=''):
+        # 返回最相近的已记录文章 (source, link, 相似度)，没有足够接近的返回 None
+        buckets = _buckets(sig)
+        rows = self.conn.execute(
+            'SELECT DISTINCT f.signature, f.source, f.link FROM fingerprint_bands AS b '
+            'JOIN fingerprints AS f ON f.id = b.id WHERE f.numbers = ? AND f.seen_at >= ? AND ('
+            + ' OR '.join('(b.band = ? AND b.bucket = ?)' for _ in buckets) + ')',
+            [title_numbers, time.time() - self.window]
+            + [value for pair in enumerate(buckets) for value in pair]).fetchall()
+        best = None
+        for stored, source, link in rows:
+            score = similarity(sig, array('I', stored))
+            if score >= self.threshold and (best is None or score > best[2]):
+                best = (source, link, score)
+        return best
+
+    def _insert(self, sig, source, link, title_numbers=''):
+        cursor = self.conn.execute('INSERT INTO fingerprints (signature, source, link, seen_at, numbers) '
+                                   'VALUES (?, ?, ?, ?, ?)',
+                                   (sig.tobytes(), source, link, time.time(), title_numbers))
+        self.conn.executemany('INSERT OR IGNORE INTO fingerprint_bands (band, bucket, id) VALUES (?, ?, ?)',
+                              ((band, bucket, cursor.lastrowid) for band, bucket in enumerate(_buckets(sig))))
+        self.added += 1
+
+    def add(self, sig, source, link, title_numbers=''):
+        with self.conn:
+            self.conn.execute('BEGIN')
+            self._insert(sig, source, link, title_numbers)
+        if self.added % PRUNE_EVERY == 0:
+            self.prune()
+
+    def check_and_add(self, sig, source, link, title_numbers=''):
+        # 查找和记录在同一个写事务中完成，多个进程同时遇到同一篇文章时只有一个会发送
+        with self.conn:
+            self.conn.execute('BEGIN IMMEDIATE')
+            match = self.find(sig, title_numbers)
+            if match is None:
+                self._insert(sig, source, link, title_numbers)
+        if match is None and self.added % PRUNE_EVERY == 0:
+            self.prune()
+        return match
+
+    def prune(self):
+        # 删除超出数量上限或超出时间窗口的最旧指纹 (id 随 seen_at 递增)
+        last = self.conn.execute('SELECT MAX(id) FROM fingerprints WHERE seen_at < ?',
+                                 (time.time() - self.window,)).fetchone()[0] or 0
+        if self.max_items:
+            row = self.conn.execute('SELECT id FROM fingerprints ORDER BY id DESC LIMIT 1 OFFSET ?',
+                                    (self.max_items,)).fetchone()
+            if row is not None:
+                last = max(last, row[0])
+        if not last:
+            return 0
+        with self.conn:
+            self.conn.execute('BEGIN')
+            self.conn.execute('DELETE FROM fingerprint_bands WHERE id <= ?', (last,))
+            removed = self.conn.execute('DELETE FROM fingerprints WHERE id <= ?', (last,)).rowcount
+        return removed
+
+    def close(self):
+        self.conn.close()
+
+
+_index = None
+_lock = threading.Lock()
+
+
+def is_duplicate(source, title, link):
+    # 发送前调用：与已发送的文章近似重复时返回 True，否则记录这篇文章的指纹并返回 False
+    global _index
+    sig = signature(title, link)
+    if sig is None:
+        return False
+    with _lock:
+        if _index is None:
+            _index = FingerprintIndex()
+        with metrics.timer('dedupe', source):
+            match = _index.check_and_add(sig, source, link, numbers(title))
+        if match is None:
+            return False
+    metrics.inc('scraper_near_duplicates_total', source=source)
+    logging.info(f"跳过近似重复的文章: {title} ({link})，与 {match[0]} 的 {match[1]} 相似度 {match[2]:.2f}")
+    return True
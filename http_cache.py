@@ -0,0 +1,107 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+from urllib.parse import urlsplit
+
+import http_transport
+import metrics
+
+# 条件请求缓存：按 URL 保存 ETag / Last-Modified。
+# 收到 304 时调用方直接跳过这一页，不需要页面内容，所以只保存校验值。
+CACHE_DIR = os.getenv('HTTP_CACHE_DIR', '.http_cache')
+# 收到 200 后先把校验值记在内存里，调用方处理成功 (文章已写入发送记录和发件箱) 后再调用 commit() 保存。
+# 处理中途出错时不保存，下次仍然完整请求，不会因为 304 而漏掉这一页的文章。
+_pending = {}
+_pending_lock = threading.Lock()
+
+# 流式读取时每块的字节数
+STREAM_CHUNK_SIZE = int(os.getenv('HTTP_STREAM_CHUNK_SIZE', '16384'))
+
+
+def _cache_path(url):
+    key = hashlib.sha1(url.encode('utf-8')).hexdigest()
+    return os.path.join(CACHE_DIR, key + '.json')
+
+
+def _atomic_write(path, data):
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def load_entry(url):
+    try:
+        with open(_cache_path(url), 'r') as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def conditional_headers(url):
+    # 根据上次保存的校验值生成 If-None-Match / If-Modified-Since 请求头
+    entry = load_entry(url)
+    headers = {}
+    if entry:
+        if entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        if entry.get('last_modified'):
+            headers['If-Modified-Since'] = entry['last_modified']
+    return headers
+
+
+def store(url, etag, last_modified):
+    # 服务器没有给出任何校验值时不缓存，下次照常完整请求
+    if not etag and not last_modified:
+        return
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    entry = {'url': url, 'etag': etag, 'last_modified': last_modified}
+    _atomic_write(_cache_path(url), json.dumps(entry).encode('utf-8'))
+
+
+def remember(url, etag, last_modified):
+    # 记下校验值，等 commit(url) 时再写入缓存
+    if not etag and not last_modified:
+        return
+    with _pending_lock:
+        _pending[url] = (etag, last_modified)
+
+
+def commit(urls):
+    # 保存 remember() 记下的校验值；调用方在这些页面的内容都处理成功后调用
+    for url in urls:
+        with _pending_lock:
+            entry = _pending.pop(url, None)
+        if entry is not None:
+            store(url, *entry)
+
+
+def fetch_stream(url, extractor, headers=None, timeout=10, client=None):
+    # 发送条件请求，边下载边交给 extractor (extractors.StreamExtractor)，读够后不再读取余下内容并关闭连接
+    # 页面未变化 (304) 时返回 None，否则返回提取到的条目；校验值在 commit(url) 后才保存
+    request_headers = dict(headers or {})
+    request_headers.update(conditional_headers(url))
+    host = urlsplit(url).netloc
+    with metrics.timer('fetch', host):
+        with (client or http_transport.client()).stream('GET', url, headers=request_headers,
+                                                        timeout=timeout) as response:
+            metrics.inc('scraper_http_responses_total', source=host, status=response.status_code)
+            if response.status_code == 304:
+                logging.info(f"{url} 未变化 (304)，跳过解析")
+                return None
+            response.raise_for_status()
+            received = 0
+            stopped = False
+            for chunk in response.iter_bytes(STREAM_CHUNK_SIZE):
+                received += len(chunk)
+                if extractor.feed(chunk):
+                    stopped = True
+                    break
+    metrics.inc('scraper_http_bytes_total', received, source=host)
+    if stopped:
+        total = response.headers.get('Content-Length')
+        logging.info(f"{url} 已读到列表结束处，读取 {received} 字节" + (f" / {total}" if total else "") + "后关闭连接")
+    remember(url, response.headers.get('ETag'), response.headers.get('Last-Modified'))
+    return extractor.close()
@@ -0,0 +1,420 @@
+import importlib.util
+import ipaddress
+import logging
+import os
+import random
+import socket
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+import httpx
+
+import metrics
+import replay
+import sent_store
+
+# 共用的 HTTP 传输层：长连接池、HTTP/2、DNS 缓存、带抖动的重试和按主机的熔断
+# 所有抓取和 Telegram 发送都通过这里创建客户端
+
+# httpx 的 HTTP/2 支持依赖 h2 (pip install 'httpx[http2]')，只检查是否安装，不在启动时导入；
+# 没有安装时只用 HTTP/1.1 长连接，创建第一个传输层时记录一次警告
+HTTP2_REQUESTED = os.getenv('HTTP2', '1') == '1'
+HTTP2 = HTTP2_REQUESTED and importlib.util.find_spec('h2') is not None
+
+TIMEOUT = float(os.getenv('HTTP_TIMEOUT', '10'))
+# 空闲长连接保留的秒数
+KEEPALIVE_EXPIRY = float(os.getenv('HTTP_KEEPALIVE_EXPIRY', '60'))
+MAX_CONNECTIONS = int(os.getenv('HTTP_MAX_CONNECTIONS', '20'))
+# 失败后的重试次数，退避时间为 [0, BACKOFF * 2^n] 内的随机值，最多 BACKOFF_MAX 秒
+# 超时最多重试一次，而且只在主机此前没有失败记录时重试，避免对已经不可用的主机反复等满 timeout
+RETRIES = int(os.getenv('HTTP_RETRIES', '2'))
+BACKOFF = float(os.getenv('HTTP_BACKOFF', '0.5'))
+BACKOFF_MAX = float(os.getenv('HTTP_BACKOFF_MAX', '8'))
+# 同一主机连续失败这么多次后熔断，熔断期间每 BREAKER_COOLDOWN 秒只放行一个探测请求
+BREAKER_THRESHOLD = int(os.getenv('HTTP_BREAKER_THRESHOLD', '5'))
+BREAKER_COOLDOWN = float(os.getenv('HTTP_BREAKER_COOLDOWN', '60'))
+# 熔断状态保存在 SQLite 中，cron 每次启动的新进程之间共享连续失败次数
+BREAKER_DB = os.getenv('HTTP_BREAKER_DB', sent_store.DB_FILE)
+# DNS 解析结果缓存的秒数和最多缓存的主机数，TTL 为 0 表示不缓存
+DNS_TTL = float(os.getenv('HTTP_DNS_TTL', '300'))
+DNS_CACHE_SIZE = int(os.getenv('HTTP_DNS_CACHE_SIZE', '256'))
+
+DEFAULT_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
+}
+
+# 这些状态码视为服务器暂时故障，可以重试
+RETRY_STATUSES = {502, 503, 504}
+# 只有幂等请求在发出后失败时才重试；其他请求只在连接建立失败时重试
+IDEMPOTENT_METHODS = {'GET', 'HEAD', 'OPTIONS'}
+
+
+class CircuitOpenError(httpx.ConnectError):
+    # 主机处于熔断状态，请求没有发出
+    pass
+
+
+_breaker_conn = None
+_breaker_lock = threading.Lock()
+
+
+def _breaker_db():
+    # 调用方持有 _breaker_lock
+    global _breaker_conn
+    if _breaker_conn is None:
+        conn = sqlite3.connect(BREAKER_DB, timeout=30, isolation_level=None, check_same_thread=False)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('''CREATE TABLE IF NOT EXISTS circuit_breakers (
+            host TEXT PRIMARY KEY,
+            failures INTEGER NOT NULL,
+            opened_at REAL
+        )''')
+        _breaker_conn = conn
+    return _breaker_conn
+
+
+class CircuitBreaker:
+    # 状态在数据库中，所有进程共用；数据库暂时不可用时不熔断，照常发出请求
+    def __init__(self, host, threshold=BREAKER_THRESHOLD, cooldown=BREAKER_COOLDOWN):
+        self.host = host
+        self.threshold = threshold
+        self.cooldown = cooldown
+
+    def _state(self, conn):
+        row = conn.execute('SELECT failures, opened_at FROM circuit_breakers WHERE host = ?',
+                           (self.host,)).fetchone()
+        return row or (0, None)
+
+    def _reject(self, request):
+        metrics.inc('http_circuit_rejected_total', source=self.host)
+        raise CircuitOpenError(f"{self.host} 处于熔断状态，跳过请求", request=request)
+
+    def before_request(self, request):
+        # 返回这次请求之前该主机的连续失败次数
+        try:
+            with _breaker_lock:
+                conn = _breaker_db()
+                failures, opened_at = self._state(conn)
+                if opened_at is None:
+                    return failures
+                now = time.time()
+                if now - opened_at < self.cooldown:
+                    claimed = False
+                else:
+                    # 冷却期已过：只有一个进程 (或线程) 能抢到这次探测，其余请求等待下一个冷却期
+                    claimed = conn.execute('UPDATE circuit_breakers SET opened_at = ? WHERE host = ? AND opened_at = ?',
+                                           (now, self.host, opened_at)).rowcount == 1
+        except sqlite3.Error as e:
+            logging.warning(f"读取 {self.host} 的熔断状态时出错: {str(e)}")
+            return 0
+        if not claimed:
+            self._reject(request)
+        return failures
+
+    def record(self, ok):
+        try:
+            with _breaker_lock:
+                conn = _breaker_db()
+                failures, opened_at = self._state(conn)
+                if ok:
+                    if failures:
+                        conn.execute('DELETE FROM circuit_breakers WHERE host = ?', (self.host,))
+                        if opened_at is not None:
+                            logging.info(f"{self.host} 已恢复，解除熔断")
+                    return
+                conn.execute('INSERT INTO circuit_breakers (host, failures) VALUES (?, 1) '
+                             'ON CONFLICT (host) DO UPDATE SET failures = failures + 1', (self.host,))
+                failures, opened_at = self._state(conn)
+                if failures >= self.threshold:
+                    if opened_at is None:
+                        logging.warning(f"{self.host} 连续失败 {failures} 次，熔断 {self.cooldown:.0f} 秒")
+                        metrics.inc('http_circuit_opened_total', source=self.host)
+                    conn.execute('UPDATE circuit_breakers SET opened_at = ? WHERE host = ?', (time.time(), self.host))
+        except sqlite3.Error as e:
+            logging.warning(f"记录 {self.host} 的熔断状态时出错: {str(e)}")
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def breaker(host):
+    with _breakers_lock:
+        if host not in _breakers:
+            _breakers[host] = CircuitBreaker(host)
+        return _breakers[host]
+
+
+def _backoff(attempt):
+    return random.uniform(0, min(BACKOFF_MAX, BACKOFF * 2 ** attempt))
+
+
+def _can_retry(request, error, attempt, prior_failures):
+    if isinstance(error, httpx.TimeoutException):
+        # 每次超时都要等满 timeout：只重试一次，主机在这次请求之前已经失败过时不重试
+        if attempt or prior_failures:
+            return False
+        return isinstance(error, (httpx.ConnectTimeout, httpx.PoolTimeout)) or request.method in IDEMPOTENT_METHODS
+    if isinstance(error, httpx.ConnectError):
+        return True
+    return request.method in IDEMPOTENT_METHODS
+
+
+def _retry_response(request, response):
+    return response.status_code in RETRY_STATUSES and request.method in IDEMPOTENT_METHODS
+
+
+class RetryTransport(httpx.BaseTransport):
+    # 包装实际的传输层，在其外面加上熔断和重试
+    def __init__(self, wrapped):
+        self.wrapped = wrapped
+
+    def handle_request(self, request):
+        host = request.url.host
+        circuit = breaker(host)
+        for attempt in range(RETRIES + 1):
+            prior_failures = circuit.before_request(request)
+            try:
+                response = self.wrapped.handle_request(request)
+            except httpx.TransportError as e:
+                circuit.record(False)
+                if attempt == RETRIES or not _can_retry(request, e, attempt, prior_failures):
+                    raise
+                logging.warning(f"请求 {request.url} 失败 ({e!r})，第 {attempt + 1} 次重试")
+            else:
+                circuit.record(response.status_code < 500)
+                if attempt == RETRIES or not _retry_response(request, response):
+                    return response
+                response.close()
+                logging.warning(f"请求 {request.url} 返回 {response.status_code}，第 {attempt + 1} 次重试")
+            metrics.inc('http_retries_total', source=host)
+            time.sleep(_backoff(attempt))
+
+    def close(self):
+        self.wrapped.close()
+
+
+class AsyncRetryTransport(httpx.AsyncBaseTransport):
+    def __init__(self, wrapped):
+        self.wrapped = wrapped
+
+    async def handle_async_request(self, request):
+        import asyncio
+
+        host = request.url.host
+        circuit = breaker(host)
+        for attempt in range(RETRIES + 1):
+            prior_failures = circuit.before_request(request)
+            try:
+                response = await self.wrapped.handle_async_request(request)
+            except httpx.TransportError as e:
+                circuit.record(False)
+                if attempt == RETRIES or not _can_retry(request, e, attempt, prior_failures):
+                    raise
+                logging.warning(f"请求 {request.url} 失败 ({e!r})，第 {attempt + 1} 次重试")
+            else:
+                circuit.record(response.status_code < 500)
+                if attempt == RETRIES or not _retry_response(request, response):
+                    return response
+                await response.aclose()
+                logging.warning(f"请求 {request.url} 返回 {response.status_code}，第 {attempt + 1} 次重试")
+            metrics.inc('http_retries_total', source=host)
+            await asyncio.sleep(_backoff(attempt))
+
+    async def aclose(self):
+        await self.wrapped.aclose()
+
+
+class _DNSCache:
+    # 按 (主机, 端口) 缓存解析出的地址，过期或超出容量的最旧条目被丢弃
+    def __init__(self, ttl=DNS_TTL, size=DNS_CACHE_SIZE):
+        self.ttl = ttl
+        self.size = size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, host, port):
+        with self._lock:
+            entry = self._entries.get((host, port))
+            if entry is None:
+                return None
+            if entry[0] <= time.monotonic():
+                del self._entries[(host, port)]
+                return None
+            self._entries.move_to_end((host, port))
+            return entry[1]
+
+    def put(self, host, port, addresses):
+        with self._lock:
+            self._entries[(host, port)] = (time.monotonic() + self.ttl, addresses)
+            self._entries.move_to_end((host, port))
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+    def drop(self, host, port):
+        with self._lock:
+            self._entries.pop((host, port), None)
+
+
+_dns_cache = _DNSCache()
+
+
+def _is_ip(host):
+    try:
+        ipaddress.ip_address(host)
+        return True
+    except ValueError:
+        return False
+
+
+def _addresses(infos):
+    return list(dict.fromkeys(info[4][0] for info in infos))
+
+
+class CachingBackend:
+    # 包装 httpcore 的网络后端：连接前先查 DNS 缓存，再连接解析出的地址。
+    # TLS 仍然按原主机名校验证书，只影响这里的连接，不修改全局的 socket.getaddrinfo。
+    # httpcore 连带 trio、anyio 导入较慢，和 httpx 一样到创建传输层之后才导入
+    def __init__(self, wrapped):
+        self.wrapped = wrapped
+
+    def _resolve(self, host, port):
+        import httpcore
+
+        addresses = _dns_cache.get(host, port)
+        if addresses is None:
+            try:
+                addresses = _addresses(socket.getaddrinfo(host, port, type=socket.SOCK_STREAM))
+            except socket.gaierror as e:
+                raise httpcore.ConnectError(str(e)) from e
+            _dns_cache.put(host, port, addresses)
+        return addresses
+
+    def connect_tcp(self, host, port, timeout=None, local_address=None, socket_options=None):
+        import httpcore
+
+        if _is_ip(host):
+            return self.wrapped.connect_tcp(host, port, timeout, local_address, socket_options)
+        error = None
+        # 连接被拒绝时换下一个地址；超时直接放弃，不为每个地址各等一次
+        for address in self._resolve(host, port):
+            try:
+                return self.wrapped.connect_tcp(address, port, timeout, local_address, socket_options)
+            except httpcore.ConnectError as e:
+                error = e
+        _dns_cache.drop(host, port)
+        raise error
+
+    def connect_unix_socket(self, path, timeout=None, socket_options=None):
+        return self.wrapped.connect_unix_socket(path, timeout, socket_options)
+
+    def sleep(self, seconds):
+        return self.wrapped.sleep(seconds)
+
+
+class AsyncCachingBackend:
+    def __init__(self, wrapped):
+        self.wrapped = wrapped
+
+    async def _resolve(self, host, port):
+        import asyncio
+
+        import httpcore
+
+        addresses = _dns_cache.get(host, port)
+        if addresses is None:
+            try:
+                infos = await asyncio.get_running_loop().getaddrinfo(host, port, type=socket.SOCK_STREAM)
+            except socket.gaierror as e:
+                raise httpcore.ConnectError(str(e)) from e
+            addresses = _addresses(infos)
+            _dns_cache.put(host, port, addresses)
+        return addresses
+
+    async def connect_tcp(self, host, port, timeout=None, local_address=None, socket_options=None):
+        import httpcore
+
+        if _is_ip(host):
+            return await self.wrapped.connect_tcp(host, port, timeout, local_address, socket_options)
+        error = None
+        for address in await self._resolve(host, port):
+            try:
+                return await self.wrapped.connect_tcp(address, port, timeout, local_address, socket_options)
+            except httpcore.ConnectError as e:
+                error = e
+        _dns_cache.drop(host, port)
+        raise error
+
+    async def connect_unix_socket(self, path, timeout=None, socket_options=None):
+        return await self.wrapped.connect_unix_socket(path, timeout, socket_options)
+
+    async def sleep(self, seconds):
+        await self.wrapped.sleep(seconds)
+
+
+_warned = set()
+
+
+def _warn_once(key, message):
+    if key not in _warned:
+        _warned.add(key)
+        logging.warning(message)
+
+
+def _with_dns_cache(transport, backend_class):
+    # httpx 不接受 network_backend 参数，把它的连接池使用的网络后端换成带缓存的；
+    # 这依赖 httpx/httpcore 的内部属性，版本变化后找不到时照常工作，只是不缓存 DNS
+    if HTTP2_REQUESTED and not HTTP2:
+        _warn_once('http2', "未安装 h2 (pip install 'httpx[http2]')，只使用 HTTP/1.1")
+    if DNS_TTL <= 0:
+        return transport
+    pool = getattr(transport, '_pool', None)
+    if hasattr(pool, '_network_backend'):
+        pool._network_backend = backend_class(pool._network_backend)
+    else:
+        _warn_once('dns', f"当前 httpx 版本的传输层没有 _pool._network_backend ({httpx.__version__})，DNS 缓存未启用")
+    return transport
+
+
+def _limits(max_connections=MAX_CONNECTIONS):
+    return httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections,
+                        keepalive_expiry=KEEPALIVE_EXPIRY)
+
+
+def sync_transport(max_connections=MAX_CONNECTIONS, use_replay=True):
+    # 录制/回放模式下由 replay 的传输层处理请求
+    wrapped = replay.transport() if use_replay else None
+    if wrapped is None:
+        wrapped = _with_dns_cache(httpx.HTTPTransport(http2=HTTP2, limits=_limits(max_connections)), CachingBackend)
+    return RetryTransport(wrapped)
+
+
+def async_transport(max_connections=MAX_CONNECTIONS, use_replay=True):
+    wrapped = replay.async_transport() if use_replay else None
+    if wrapped is None:
+        wrapped = _with_dns_cache(httpx.AsyncHTTPTransport(http2=HTTP2, limits=_limits(max_connections)),
+                                  AsyncCachingBackend)
+    return AsyncRetryTransport(wrapped)
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def client():
+    # 进程内共用的同步客户端，长连接在多次调用之间复用；httpx.Client 可以在多个线程中使用
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = httpx.Client(headers=DEFAULT_HEADERS, timeout=TIMEOUT, follow_redirects=True,
+                                   transport=sync_transport())
+        return _client
+
+
+def async_client(headers=None, timeout=TIMEOUT, max_connections=MAX_CONNECTIONS, use_replay=True):
+    # 异步客户端绑定在事件循环上，每次 asyncio.run 内创建一个并在其中复用
+    return httpx.AsyncClient(headers={**DEFAULT_HEADERS, **(headers or {})}, timeout=timeout,
+                             follow_redirects=True,
+                             transport=async_transport(max_connections, use_replay))
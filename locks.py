@@ -0,0 +1,122 @@
+import functools
+import logging
+import os
+import threading
+import time
+
+if os.name == 'nt':
+    import msvcrt
+else:
+    import fcntl
+
+# 跨进程的文件锁：Unix 上用 fcntl.flock，Windows 上用 msvcrt.locking。
+# 锁随文件描述符存在，进程崩溃或被杀时由系统释放，所以也可以当作租约使用。
+
+LOCK_DIR = os.getenv('LOCK_DIR', '.locks')
+
+
+def _try_lock(fd):
+    if os.name == 'nt':
+        try:
+            msvcrt.locking(fd, msvcrt.LK_NBLCK, 1)
+            return True
+        except OSError:
+            return False
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        return True
+    except BlockingIOError:
+        return False
+
+
+def _lock(fd):
+    if os.name == 'nt':
+        # msvcrt 的阻塞模式只重试 10 秒，自行轮询
+        while not _try_lock(fd):
+            time.sleep(0.05)
+    else:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+
+
+def _unlock(fd):
+    if os.name == 'nt':
+        os.lseek(fd, 0, os.SEEK_SET)
+        msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+    else:
+        fcntl.flock(fd, fcntl.LOCK_UN)
+
+
+class FileLock:
+    # 用法与 threading.Lock 相同；同一进程的多个线程之间同样互斥
+    # 每次加锁重新打开文件，fork 出的子进程不会共享父进程持有的锁
+    def __init__(self, path):
+        self.path = path
+        self._thread_lock = threading.Lock()
+        self._fd = None
+
+    def acquire(self, blocking=True):
+        if not self._thread_lock.acquire(blocking):
+            return False
+        try:
+            fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        except BaseException:
+            self._thread_lock.release()
+            raise
+        try:
+            if blocking:
+                _lock(fd)
+            elif not _try_lock(fd):
+                os.close(fd)
+                self._thread_lock.release()
+                return False
+        except BaseException:
+            os.close(fd)
+            self._thread_lock.release()
+            raise
+        self._fd = fd
+        return True
+
+    def release(self):
+        fd, self._fd = self._fd, None
+        try:
+            _unlock(fd)
+        finally:
+            os.close(fd)
+            self._thread_lock.release()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.release()
+
+
+_leases = {}
+_leases_lock = threading.Lock()
+
+
+def lease(name):
+    # 每个来源一个租约锁，同一来源在所有进程中同一时间只运行一份
+    with _leases_lock:
+        if name not in _leases:
+            os.makedirs(LOCK_DIR, exist_ok=True)
+            _leases[name] = FileLock(os.path.join(LOCK_DIR, f'{name}.lock'))
+        return _leases[name]
+
+
+def exclusive(name):
+    # 装饰来源的入口函数：上一次运行 (可能在别的进程中) 尚未结束时直接跳过，返回 None
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            source_lease = lease(name)
+            if not source_lease.acquire(blocking=False):
+                logging.warning(f"{name} 的上一次运行尚未结束，跳过本次运行")
+                return None
+            try:
+                return func(*args, **kwargs)
+            finally:
+                source_lease.release()
+        return wrapper
+    return decorator
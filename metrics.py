@@ -0,0 +1,266 @@
+import bisect
+import functools
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import locks
+
+# 各抓取脚本共用的轻量指标：计数器和耗时直方图，可导出为 Prometheus 文本或每轮运行的 JSON 摘要
+
+METRICS_DIR = os.getenv('METRICS_DIR', 'metrics')
+PROMETHEUS_FILE = os.path.join(METRICS_DIR, 'metrics.prom')
+# metrics.prom 由每次运行的进程累加写入：累计值保存在旁边的 JSON 文件中 (textfile collector 只读取 *.prom)
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+_lock = threading.Lock()
+# (指标名, 标签元组) -> 值
+_counters = {}
+# (指标名, 标签元组) -> [各桶计数..., +Inf 计数, 总和]
+_histograms = {}
+# 上一次写出 metrics.prom 时的原始计数，下一次只把之后的增量累加到文件中
+_written = ({}, {})
+
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+
+def inc(name, value=1, **labels):
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+def observe(name, value, **labels):
+    key = _key(name, labels)
+    index = bisect.bisect_left(BUCKETS, value)
+    with _lock:
+        histogram = _histograms.get(key)
+        if histogram is None:
+            histogram = _histograms[key] = [0] * (len(BUCKETS) + 2)
+        histogram[index] += 1
+        histogram[-1] += value
+
+
+@contextmanager
+def timer(stage, source):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe('scraper_stage_seconds', time.perf_counter() - start, stage=stage, source=source)
+
+
+def _escape_label(value):
+    # Prometheus 文本格式要求标签值中的反斜杠、双引号和换行转义 (路由名等来自配置，可能含有这些字符)
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape_label(value)}"' for name, value in pairs) + '}'
+
+
+def render_prometheus(counters=None, histograms=None):
+    # 默认导出本进程的指标
+    if counters is None:
+        counters, histograms = export()
+
+    lines = []
+    for name in sorted({name for name, _ in counters}):
+        lines.append(f'# TYPE {name} counter')
+        for (metric, labels), value in sorted(counters.items()):
+            if metric == name:
+                lines.append(f'{name}{_format_labels(labels)} {value}')
+    for name in sorted({name for name, _ in histograms}):
+        lines.append(f'# TYPE {name} histogram')
+        for (metric, labels), values in sorted(histograms.items()):
+            if metric != name:
+                continue
+            cumulative = 0
+            for bound, count in zip(BUCKETS, values):
+                cumulative += count
+                lines.append(f'{name}_bucket{_format_labels(labels, [("le", bound)])} {cumulative}')
+            cumulative += values[len(BUCKETS)]
+            lines.append(f'{name}_bucket{_format_labels(labels, [("le", "+Inf")])} {cumulative}')
+            lines.append(f'{name}_sum{_format_labels(labels)} {values[-1]}')
+            lines.append(f'{name}_count{_format_labels(labels)} {cumulative}')
+    return '\n'.join(lines) + '\n'
+
+
+def _atomic_write(path, text):
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+
+def _state_key(name, labels):
+    # JSON 读回的标签值都是字符串，内存中的标签值也按字符串归一，同一序列才能合并
+    return name, tuple((label, str(value)) for label, value in labels)
+
+
+def _load_state(path):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            state = json.load(f)
+        counters = {_state_key(name, labels): value for name, labels, value in state['counters']}
+        histograms = {_state_key(name, labels): values for name, labels, values in state['histograms']}
+    except FileNotFoundError:
+        return {}, {}
+    except (ValueError, KeyError, TypeError) as e:
+        logging.error(f"读取 {path} 时出错，累计指标从零开始: {str(e)}")
+        return {}, {}
+    return counters, histograms
+
+
+def write_prometheus(path=PROMETHEUS_FILE):
+    # 供 node_exporter 的 textfile collector 读取。各来源通常是 cron 启动的独立进程，
+    # 直接覆盖会丢掉其他来源的序列并让计数器倒退；这里在文件锁内把本进程上次写出后的增量
+    # 累加到磁盘上的累计值，再重新生成整个文件
+    global _written
+    counters, histograms = export()
+    written_counters, written_histograms = _written
+    state_path = path + '.json'
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with locks.FileLock(path + '.lock'):
+        total_counters, total_histograms = _load_state(state_path)
+        for key, value in counters.items():
+            delta = value - written_counters.get(key, 0)
+            if delta:
+                key = _state_key(*key)
+                total_counters[key] = total_counters.get(key, 0) + delta
+        for key, values in histograms.items():
+            before = written_histograms.get(key, [0] * len(values))
+            delta = [a - b for a, b in zip(values, before)]
+            if any(delta):
+                key = _state_key(*key)
+                total = total_histograms.get(key)
+                if total is None or len(total) != len(delta):
+                    total_histograms[key] = delta
+                else:
+                    total_histograms[key] = [a + b for a, b in zip(total, delta)]
+        _atomic_write(state_path, json.dumps({
+            'counters': [[name, labels, value] for (name, labels), value in total_counters.items()],
+            'histograms': [[name, labels, values] for (name, labels), values in total_histograms.items()],
+        }, ensure_ascii=False))
+        _atomic_write(path, render_prometheus(total_counters, total_histograms))
+    _written = (counters, histograms)
+
+
+def reset():
+    global _written
+    with _lock:
+        _counters.clear()
+        _histograms.clear()
+        _written = ({}, {})
+
+
+def export():
+    # 原始计数，供工作进程交给主进程合并
+    with _lock:
+        return dict(_counters), {key: list(value) for key, value in _histograms.items()}
+
+
+def merge(counters, histograms):
+    with _lock:
+        for key, value in counters.items():
+            _counters[key] = _counters.get(key, 0) + value
+        for key, value in histograms.items():
+            histogram = _histograms.get(key)
+            if histogram is None:
+                _histograms[key] = list(value)
+            else:
+                _histograms[key] = [a + b for a, b in zip(histogram, value)]
+
+
+def snapshot():
+    with _lock:
+        counters = dict(_counters)
+        histograms = {key: (sum(value[:-1]), value[-1]) for key, value in _histograms.items()}
+    return counters, histograms
+
+
+def _label_text(name, labels):
+    return name + _format_labels(labels)
+
+
+def summarize(before, after, source, seconds):
+    # 两个快照之间的增量：计数器差值，以及各阶段的次数、总耗时和平均耗时
+    counters_before, histograms_before = before
+    counters_after, histograms_after = after
+    counters = {}
+    for key, value in counters_after.items():
+        delta = value - counters_before.get(key, 0)
+        if delta:
+            counters[_label_text(*key)] = delta
+    stages = {}
+    for key, (count, total) in histograms_after.items():
+        count_before, total_before = histograms_before.get(key, (0, 0))
+        if count > count_before:
+            count, total = count - count_before, total - total_before
+            stages[_label_text(*key)] = {'count': count, 'total_seconds': total, 'mean_seconds': total / count}
+    return {
+        'source': source,
+        'finished_at': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'seconds': seconds,
+        'counters': counters,
+        'stages': stages,
+    }
+
+
+def track_run(source):
+    # 装饰一次完整的运行：结束后写出本轮的 JSON 摘要并刷新 Prometheus 文本文件
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            before = snapshot()
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                seconds = time.perf_counter() - start
+                observe('scraper_run_seconds', seconds, source=source)
+                try:
+                    summary = summarize(before, snapshot(), source, seconds)
+                    _atomic_write(os.path.join(METRICS_DIR, f'run_{source}.json'),
+                                  json.dumps(summary, ensure_ascii=False, indent=2))
+                    if PROMETHEUS_FILE:
+                        write_prometheus(PROMETHEUS_FILE)
+                except OSError as e:
+                    logging.error(f"写入指标时出错: {str(e)}")
+        return wrapper
+    return decorator
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path != '/metrics':
+            self.send_error(404)
+            return
+        body = render_prometheus().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(port, host='127.0.0.1'):
+    # 在后台线程中提供 /metrics
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    logging.info(f"指标服务已启动: http://{host}:{port}/metrics")
+    return server
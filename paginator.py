@@ -0,0 +1,54 @@
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+# 分页补抓：从第一页往后翻，遇到整页都是已发送过的链接就停止
+# 正常情况下只抓第一页；停机一段时间后能补回已经翻到后面几页的文章
+
+MAX_PAGES = int(os.getenv('BACKFILL_MAX_PAGES', '10'))
+
+
+def _has_new(articles, is_known):
+    return any(not is_known(article['link']) for article in articles)
+
+
+def crawl(page_url, fetch_page, is_known, max_pages=MAX_PAGES, start_page=1):
+    # 逐页产出文章列表；调用方处理当前页时，下一页已经在后台线程中抓取
+    # fetch_page 返回 None (未变化) 或空列表时停止
+    end_page = start_page + max_pages
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        future = executor.submit(fetch_page, page_url(start_page))
+        for page in range(start_page, end_page):
+            articles = future.result()
+            if not articles or not _has_new(articles, is_known):
+                return
+            if page + 1 < end_page:
+                future = executor.submit(fetch_page, page_url(page + 1))
+            if page > 1:
+                logging.info(f"补抓第 {page} 页，{len(articles)} 篇文章")
+            yield articles
+    if max_pages > 1:
+        logging.warning(f"补抓达到 {max_pages} 页上限，停止翻页")
+
+
+async def acrawl(page_url, fetch_page, is_known, max_pages=MAX_PAGES, start_page=1):
+    # crawl 的异步版本，fetch_page 为协程函数
+    import asyncio
+
+    end_page = start_page + max_pages
+    task = asyncio.create_task(fetch_page(page_url(start_page)))
+    try:
+        for page in range(start_page, end_page):
+            articles = await task
+            if not articles or not _has_new(articles, is_known):
+                return
+            if page + 1 < end_page:
+                task = asyncio.create_task(fetch_page(page_url(page + 1)))
+            if page > 1:
+                logging.info(f"补抓第 {page} 页，{len(articles)} 篇文章")
+            yield articles
+    finally:
+        if not task.done():
+            task.cancel()
+    if max_pages > 1:
+        logging.warning(f"补抓达到 {max_pages} 页上限，停止翻页")
@@ -0,0 +1,106 @@
+import hashlib
+import json
+import logging
+import os
+
+import httpx
+
+# HTTP 录制/回放：record 模式把真实响应保存为夹具，replay 模式只从夹具读取，不访问网络
+MODE = os.getenv('HTTP_REPLAY_MODE', '')
+RECORDINGS_DIR = os.getenv('HTTP_REPLAY_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                                           'benchmarks', 'recordings'))
+
+# 回放时不需要保留的响应头
+_DROP_HEADERS = {'content-encoding', 'content-length', 'transfer-encoding', 'connection'}
+
+
+def _paths(url):
+    key = hashlib.sha1(url.encode('utf-8')).hexdigest()
+    return os.path.join(RECORDINGS_DIR, key + '.json'), os.path.join(RECORDINGS_DIR, key + '.body')
+
+
+def save(url, status_code, headers, body):
+    os.makedirs(RECORDINGS_DIR, exist_ok=True)
+    meta_path, body_path = _paths(url)
+    with open(body_path, 'wb') as f:
+        f.write(body)
+    headers = {name: value for name, value in headers.items() if name.lower() not in _DROP_HEADERS}
+    with open(meta_path, 'w', encoding='utf-8') as f:
+        json.dump({'url': url, 'status_code': status_code, 'headers': headers}, f, ensure_ascii=False, indent=2)
+
+
+def load(url):
+    meta_path, body_path = _paths(url)
+    try:
+        with open(meta_path, 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        with open(body_path, 'rb') as f:
+            body = f.read()
+    except FileNotFoundError:
+        return None
+    return meta['status_code'], meta['headers'], body
+
+
+def _replay_response(request):
+    url = str(request.url)
+    recorded = load(url)
+    if recorded is None:
+        logging.error(f"回放模式下没有 {url} 的录制内容")
+        return httpx.Response(404, request=request)
+    status_code, headers, body = recorded
+    # 录制时带有 ETag 的响应，回放时同样支持条件请求
+    etag = headers.get('ETag') or headers.get('etag')
+    if etag and request.headers.get('If-None-Match') == etag:
+        return httpx.Response(304, headers=headers, request=request)
+    return httpx.Response(status_code, headers=headers, content=body, request=request)
+
+
+class ReplayTransport(httpx.BaseTransport):
+    def handle_request(self, request):
+        return _replay_response(request)
+
+
+class AsyncReplayTransport(httpx.AsyncBaseTransport):
+    async def handle_async_request(self, request):
+        return _replay_response(request)
+
+
+class RecordingTransport(httpx.BaseTransport):
+    def __init__(self):
+        self.wrapped = httpx.HTTPTransport()
+
+    def handle_request(self, request):
+        response = self.wrapped.handle_request(request)
+        response.read()
+        if response.status_code != 304:
+            save(str(request.url), response.status_code, response.headers, response.content)
+        return response
+
+
+class AsyncRecordingTransport(httpx.AsyncBaseTransport):
+    def __init__(self):
+        self.wrapped = httpx.AsyncHTTPTransport()
+
+    async def handle_async_request(self, request):
+        response = await self.wrapped.handle_async_request(request)
+        await response.aread()
+        if response.status_code != 304:
+            save(str(request.url), response.status_code, response.headers, response.content)
+        return response
+
+
+def transport():
+    # 未启用录制/回放时返回 None，使用 httpx 默认传输
+    if MODE == 'record':
+        return RecordingTransport()
+    if MODE == 'replay':
+        return ReplayTransport()
+    return None
+
+
+def async_transport():
+    if MODE == 'record':
+        return AsyncRecordingTransport()
+    if MODE == 'replay':
+        return AsyncReplayTransport()
+    return None
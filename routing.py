@@ -0,0 +1,128 @@
+import json
+import logging
+import os
+import re
+import threading
+
+import metrics
+
+# 消息路由：按 routes.json 把每篇文章分发到多个聊天，每篇文章只抓取、解析和渲染一次。
+# 没有 routes.json 时所有消息照旧发往各脚本的 TELEGRAM_CHANNEL_ID。
+#
+# routes.json 示例：
+# {"routes": [
+#     {"name": "诗歌", "chat_id": "@poetry", "sources": ["chinawriter", "chinawriter_sections"],
+#      "keywords": ["诗歌", "诗人"], "exclude": ["广告"]},
+#     {"name": "新作品", "chat_id": "-1001234567890", "sources": ["chinawriter_sections"], "sections": ["新作品"]},
+#     {"name": "全部", "chat_id": "@everything", "sources": ["*"]}
+# ]}
+# sources 省略或含 "*" 时匹配所有来源；sections、keywords 省略时不限；keywords 命中任一个即可，
+# exclude 命中任一个即不发送。关键词在标题中查找，不区分大小写。
+
+ROUTES_FILE = os.getenv('ROUTES_FILE', 'routes.json')
+
+
+class Route:
+    def __init__(self, config):
+        self.name = config.get('name') or str(config['chat_id'])
+        self.chat_id = str(config['chat_id'])
+        self.sections = set(config.get('sections') or ())
+        self.keywords = {keyword.casefold() for keyword in config.get('keywords') or ()}
+        self.exclude = {keyword.casefold() for keyword in config.get('exclude') or ()}
+
+    def matches(self, section, found):
+        if self.sections and section not in self.sections:
+            return False
+        if self.keywords and not self.keywords & found:
+            return False
+        return not self.exclude & found
+
+
+class Router:
+    # 所有规则的关键词合成一个正则，每个标题只扫描一次；
+    # 带关键词的规则只在它的关键词命中时才检查，规则再多也只看少数几条
+    def __init__(self, routes):
+        self.routes = routes
+        self.sources = []
+        # 不限关键词的规则总要检查；带关键词的规则按关键词建倒排索引
+        self.plain = []
+        self.by_keyword = {}
+        keywords = set()
+        for index, (route, sources) in enumerate(routes):
+            self.sources.append(None if not sources or '*' in sources else sources)
+            if route.keywords:
+                for keyword in route.keywords:
+                    self.by_keyword.setdefault(keyword, []).append(index)
+            else:
+                self.plain.append(index)
+            keywords |= route.keywords | route.exclude
+        # 同一位置以最长的关键词为准，它包含的较短关键词一并算作命中
+        ordered = sorted(keywords, key=len, reverse=True)
+        self.pattern = re.compile('(?=(' + '|'.join(map(re.escape, ordered)) + '))') if ordered else None
+        self.contained = {keyword: {other for other in keywords if other in keyword} for keyword in keywords}
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'r', encoding='utf-8') as f:
+            config = json.load(f)
+        return cls([(Route(item), set(item.get('sources') or ())) for item in config.get('routes', [])])
+
+    def keywords_in(self, text):
+        found = set()
+        if self.pattern is not None and text:
+            for match in self.pattern.finditer(text.casefold()):
+                found |= self.contained[match.group(1)]
+        return found
+
+    def match(self, source, title='', section=None):
+        # 返回命中的规则 (按配置顺序)，同一聊天只出现一次
+        found = self.keywords_in(title)
+        candidates = set(self.plain)
+        for keyword in found:
+            candidates.update(self.by_keyword.get(keyword, ()))
+        matched = {}
+        for index in sorted(candidates):
+            sources = self.sources[index]
+            if sources is not None and source not in sources:
+                continue
+            route = self.routes[index][0]
+            if route.chat_id not in matched and route.matches(section, found):
+                matched[route.chat_id] = route
+        return list(matched.values())
+
+
+_router = None
+_router_mtime = None
+_router_lock = threading.Lock()
+
+
+def router():
+    # routes.json 修改后自动重新加载；文件不存在时返回 None
+    global _router, _router_mtime
+    try:
+        mtime = os.stat(ROUTES_FILE).st_mtime_ns
+    except FileNotFoundError:
+        return None
+    with _router_lock:
+        if mtime != _router_mtime:
+            try:
+                _router = Router.load(ROUTES_FILE)
+                logging.info(f"已加载 {ROUTES_FILE}: {len(_router.routes)} 条路由规则")
+            except (OSError, ValueError, KeyError, TypeError) as e:
+                # 配置写错时继续使用上一次加载成功的规则
+                logging.error(f"加载 {ROUTES_FILE} 时出错: {str(e)}")
+            _router_mtime = mtime
+        return _router
+
+
+def chats(source, title='', section=None, default=None):
+    # 返回应当收到这条消息的聊天；没有配置路由时只发往 default
+    current = router()
+    if current is None:
+        return [default] if default else []
+    routes = current.match(source, title, section)
+    for route in routes:
+        metrics.inc('routing_matches_total', source=source, route=route.name)
+    if not routes:
+        metrics.inc('routing_unmatched_total', source=source)
+    return [route.chat_id for route in routes]
@@ -0,0 +1,71 @@
+import argparse
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import metrics
+import sources
+
+# 多进程运行器：把来源分给若干工作进程各运行一次，适合由 cron 定时启动。
+# 每个来源的入口函数带有 locks.exclusive 租约，上一次运行 (无论在哪个进程) 未结束的来源会被跳过；
+# 发送记录、指纹在 SQLite 事务中更新，发件箱和摘要由文件锁保护，多个进程可以同时写入。
+
+WORKERS = int(os.getenv('RUNNER_WORKERS', str(min(4, os.cpu_count() or 1))))
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# 工作进程内已加载的入口函数
+_funcs = {}
+
+
+def _init_worker():
+    # 各工作进程只把指标交回主进程，由主进程统一写出 metrics.prom
+    metrics.PROMETHEUS_FILE = None
+
+
+def run_one(name):
+    # 在工作进程中运行一个来源，返回 (来源名, 结果, 耗时, 指标)；结果为 None 表示被租约跳过
+    metrics.reset()
+    if name not in _funcs:
+        _funcs[name] = sources.load_source(name)
+    start = time.perf_counter()
+    try:
+        result = _funcs[name]()
+    except Exception as e:
+        logging.error(f"运行 {name} 时出错: {str(e)}")
+        result = e
+    return name, result, time.perf_counter() - start, metrics.export()
+
+
+def run(names, workers=WORKERS):
+    # 来源数多于进程数时，先结束的进程接着运行下一个来源
+    results = {}
+    with ProcessPoolExecutor(max_workers=min(workers, len(names)), initializer=_init_worker) as pool:
+        futures = [pool.submit(run_one, name) for name in names]
+        for future in as_completed(futures):
+            name, result, seconds, (counters, histograms) = future.result()
+            metrics.merge(counters, histograms)
+            results[name] = result
+            if result is None:
+                logging.info(f"{name}: 已在其他进程中运行，跳过")
+            elif isinstance(result, Exception):
+                logging.info(f"{name}: 失败，耗时 {seconds:.1f} 秒")
+            else:
+                logging.info(f"{name}: 新增 {result} 条，耗时 {seconds:.1f} 秒")
+    try:
+        metrics.write_prometheus(metrics.PROMETHEUS_FILE)
+    except OSError as e:
+        logging.error(f"写入指标时出错: {str(e)}")
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='在多个进程中运行各来源一次')
+    parser.add_argument('sources', nargs='*', help=f"要运行的来源，省略时运行全部: {', '.join(sources.SOURCES)}")
+    parser.add_argument('--workers', type=int, default=WORKERS)
+    args = parser.parse_args()
+    unknown = set(args.sources) - set(sources.SOURCES)
+    if unknown:
+        parser.error(f"未知的来源: {', '.join(sorted(unknown))}")
+    run(args.sources or list(sources.SOURCES), args.workers)
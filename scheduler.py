@@ -0,0 +1,92 @@
+import asyncio
+import datetime
+import logging
+import os
+import random
+import time
+
+import feed_server
+import metrics
+from sources import load_source
+
+# 单一常驻进程：每个抓取脚本注册为一个来源，按各自的发布频率自适应调整轮询间隔
+
+# 发布频率的指数滑动平均系数
+RATE_SMOOTHING = 0.3
+# 期望每次轮询平均抓到的新条目数
+TARGET_ITEMS_PER_POLL = 1.0
+# 每次间隔随机浮动的比例，避免所有来源同时发请求
+JITTER = 0.1
+# 设置后在该端口提供 /metrics
+METRICS_PORT = int(os.getenv('METRICS_PORT', '0'))
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+
+class Source:
+    def __init__(self, name, func, interval, min_interval, max_interval):
+        self.name = name
+        self.func = func
+        self.interval = interval
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        # 估计的发布频率 (条/秒)，初始假设每个默认间隔发布一条
+        self.rate = TARGET_ITEMS_PER_POLL / interval
+        self.last_poll = None
+
+    def adapt(self, new_items, now):
+        # 根据两次轮询之间的新条目数估计发布频率，换算成下一次的轮询间隔
+        if self.last_poll is not None:
+            observed = new_items / max(now - self.last_poll, 1)
+            self.rate = RATE_SMOOTHING * observed + (1 - RATE_SMOOTHING) * self.rate
+            if self.rate > 0:
+                self.interval = TARGET_ITEMS_PER_POLL / self.rate
+            else:
+                self.interval = self.max_interval
+            self.interval = min(self.max_interval, max(self.min_interval, self.interval))
+        self.last_poll = now
+
+    def next_delay(self):
+        return self.interval * random.uniform(1 - JITTER, 1 + JITTER)
+
+
+async def run_source(source):
+    while True:
+        started = time.monotonic()
+        try:
+            # 抓取脚本都是同步代码，放到线程中运行，多个来源互不阻塞
+            new_items = await asyncio.to_thread(source.func) or 0
+        except Exception as e:
+            logging.error(f"运行 {source.name} 时出错: {str(e)}")
+            new_items = 0
+        source.adapt(new_items, time.monotonic())
+        delay = source.next_delay()
+        logging.info(f"{source.name}: 新增 {new_items} 条，耗时 {time.monotonic() - started:.1f} 秒，"
+                     f"{delay:.0f} 秒后再次检查")
+        await asyncio.sleep(delay)
+
+
+async def run(sources):
+    if feed_server.PORT:
+        # RSS 服务与调度器共用同一个事件循环
+        await feed_server.start()
+    await asyncio.gather(*(run_source(source) for source in sources))
+
+
+def default_sources():
+    minute, hour = 60, 3600
+    return [
+        Source('chinawriter', load_source('chinawriter'), hour, 5 * minute, 6 * hour),
+        Source('chinawriter_sections', load_source('chinawriter_sections'), hour, 10 * minute, 6 * hour),
+        Source('wizardofodds', load_source('wizardofodds'), hour, 15 * minute, 12 * hour),
+        Source('zhihu', load_source('zhihu'), 5 * minute, minute, 30 * minute),
+        Source('tgstat', load_source('tgstat'), hour, 30 * minute, 12 * hour),
+        Source('check', load_source('check'), 30, 30, 10 * minute),
+    ]
+
+
+if __name__ == "__main__":
+    logging.info(f"调度器启动: {datetime.datetime.now()}")
+    if METRICS_PORT:
+        metrics.serve(METRICS_PORT)
+    asyncio.run(run(default_sources()))
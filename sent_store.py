@@ -0,0 +1,125 @@
+import json
+import logging
+import os
+import re
+import sqlite3
+import time
+
+import metrics
+
+# 已发送记录统一存放在 SQLite 中，按来源区分
+DB_FILE = os.getenv('SENT_HISTORY_DB', 'sent_history.db')
+# 每个来源最多保留的记录数，以及最长保留天数 (0 表示不限)
+MAX_ITEMS = int(os.getenv('SENT_HISTORY_MAX_ITEMS', '100000'))
+MAX_DAYS = float(os.getenv('SENT_HISTORY_MAX_DAYS', '0'))
+
+
+def _connect(path):
+    # isolation_level=None 使每条 INSERT 单独提交，中断时不会损坏已有记录
+    conn = sqlite3.connect(path, timeout=30, isolation_level=None)
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=NORMAL')
+    conn.execute('''CREATE TABLE IF NOT EXISTS sent (
+        source TEXT NOT NULL,
+        key TEXT NOT NULL,
+        sent_at REAL NOT NULL,
+        PRIMARY KEY (source, key)
+    ) WITHOUT ROWID''')
+    conn.execute('CREATE INDEX IF NOT EXISTS sent_by_time ON sent (source, sent_at)')
+    conn.execute('CREATE TABLE IF NOT EXISTS migrations (name TEXT PRIMARY KEY, migrated_at REAL NOT NULL)')
+    return conn
+
+
+_JSON_STRING_RE = re.compile(r'"(?:[^"\\]|\\.)*"')
+
+
+def _recover_keys(path):
+    # 旧文件是字符串列表，截断处之前每个完整的字符串都是一条记录；最后一个不完整的字符串没有结束引号，匹配不到
+    with open(path, 'r', errors='replace') as f:
+        text = f.read()
+    keys = []
+    for match in _JSON_STRING_RE.finditer(text):
+        try:
+            keys.append(json.loads(match.group()))
+        except ValueError:
+            continue
+    return keys
+
+
+class SentStore:
+    # 与 set 相同的用法：`key in store`、`store.add(key)`
+    def __init__(self, source, path=DB_FILE, max_items=MAX_ITEMS, max_days=MAX_DAYS):
+        self.source = source
+        self.max_items = max_items
+        self.max_days = max_days
+        self.added = 0
+        self.conn = _connect(path)
+
+    def __contains__(self, key):
+        with metrics.timer('dedupe', self.source):
+            row = self.conn.execute('SELECT 1 FROM sent WHERE source = ? AND key = ?', (self.source, key)).fetchone()
+        metrics.inc('scraper_dedupe_total', source=self.source, result='hit' if row else 'miss')
+        return row is not None
+
+    def __bool__(self):
+        # 只判断是否有记录，不统计总数
+        row = self.conn.execute('SELECT 1 FROM sent WHERE source = ? LIMIT 1', (self.source,)).fetchone()
+        return row is not None
+
+    def __len__(self):
+        return self.conn.execute('SELECT COUNT(*) FROM sent WHERE source = ?', (self.source,)).fetchone()[0]
+
+    def add(self, key):
+        cursor = self.conn.execute('INSERT OR IGNORE INTO sent (source, key, sent_at) VALUES (?, ?, ?)',
+                                   (self.source, key, time.time()))
+        self.added += cursor.rowcount
+
+    def prune(self):
+        # 先按时间、再按数量淘汰最旧的记录；本次没有新增时无需检查
+        if not self.added:
+            return 0
+        removed = 0
+        if self.max_days:
+            cutoff = time.time() - self.max_days * 86400
+            removed += self.conn.execute('DELETE FROM sent WHERE source = ? AND sent_at < ?',
+                                         (self.source, cutoff)).rowcount
+        if self.max_items:
+            row = self.conn.execute('SELECT sent_at FROM sent WHERE source = ? ORDER BY sent_at DESC LIMIT 1 OFFSET ?',
+                                    (self.source, self.max_items)).fetchone()
+            if row is not None:
+                removed += self.conn.execute('DELETE FROM sent WHERE source = ? AND sent_at <= ?',
+                                             (self.source, row[0])).rowcount
+        if removed:
+            logging.info(f"已从 {self.source} 的发送记录中淘汰 {removed} 条最旧记录")
+        self.added = 0
+        return removed
+
+    def migrate_json(self, path):
+        # 把旧的 sent_*.json 导入一次；旧文件没有时间信息，以文件修改时间为准依次错开
+        name = f"{self.source}:{os.path.basename(path)}"
+        if self.conn.execute('SELECT 1 FROM migrations WHERE name = ?', (name,)).fetchone():
+            return 0
+        try:
+            with open(path, 'r') as f:
+                keys = json.load(f)
+            sent_at = os.path.getmtime(path)
+        except FileNotFoundError:
+            keys, sent_at = [], time.time()
+        except ValueError as e:
+            # 文件被截断或写坏时从还能读出的部分找回记录，否则这些文章会被重新发送一遍；
+            # 坏文件挪到一边留给人工检查，并记为已导入，不再每次启动都重试
+            keys, sent_at = _recover_keys(path), os.path.getmtime(path)
+            logging.error(f"{path} 不是有效的 JSON ({str(e)})，从中找回 {len(keys)} 条记录，"
+                          f"原文件已移到 {path}.corrupt")
+            os.replace(path, path + '.corrupt')
+        with self.conn:
+            self.conn.execute('BEGIN')
+            self.conn.executemany('INSERT OR IGNORE INTO sent (source, key, sent_at) VALUES (?, ?, ?)',
+                                  ((self.source, key, sent_at - (len(keys) - i) * 1e-6)
+                                   for i, key in enumerate(keys)))
+            self.conn.execute('INSERT INTO migrations (name, migrated_at) VALUES (?, ?)', (name, time.time()))
+        logging.info(f"已从 {path} 导入 {len(keys)} 条发送记录")
+        return len(keys)
+
+    def close(self):
+        self.conn.close()
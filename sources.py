@@ -0,0 +1,30 @@
+import importlib
+import importlib.util
+import os
+
+# 来源名 -> (模块名, 脚本文件名, 入口函数)；文件名为 None 时直接按模块名导入
+# 调度器、多进程运行器和单次运行入口共用这张表；这里只记录名字，用到哪个来源才导入哪个模块
+SOURCES = {
+    'chinawriter': ('chinawriter_rss', None, 'update_articles'),
+    'chinawriter_sections': ('chinawriter_sections', 'chinawriter_rss copy.py', 'update_rss'),
+    'wizardofodds': ('wizardofodds_scraper', None, 'update_articles'),
+    'zhihu': ('zhihu', None, 'check_updates'),
+    'tgstat': ('tgstat_scraper', None, 'update_tgstat_info'),
+    'check': ('check', None, 'check_for_change'),
+}
+
+
+def load_module(name, filename=None):
+    # 文件名含空格的脚本 (chinawriter_rss copy.py) 无法直接 import，按路径加载
+    if filename is None:
+        return importlib.import_module(name)
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), filename)
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def load_source(name):
+    module_name, filename, func_name = SOURCES[name]
+    return getattr(load_module(module_name, filename), func_name)
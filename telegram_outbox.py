@@ -0,0 +1,259 @@
+import json
+import logging
+import os
+import random
+import time
+import uuid
+
+import locks
+import metrics
+
+# 待发送消息先写入发件箱文件，再由 drain() 按 Telegram 的速率限制发出
+OUTBOX_FILE = os.getenv('TELEGRAM_OUTBOX_FILE', 'telegram_outbox.jsonl')
+FAILED_FILE = os.getenv('TELEGRAM_OUTBOX_FAILED_FILE', 'telegram_outbox_failed.jsonl')
+API_BASE = os.getenv('TELEGRAM_API_BASE', 'https://api.telegram.org')
+
+# 异步发送部分 (asyncio、httpx) 到真正有消息要发时才导入，没有新消息的运行不承担这部分启动开销
+
+# 全局每秒约 30 条，同一频道/群组每分钟约 20 条
+GLOBAL_RATE = float(os.getenv('TELEGRAM_GLOBAL_RATE', '30'))
+GLOBAL_BURST = float(os.getenv('TELEGRAM_GLOBAL_BURST', '30'))
+CHAT_RATE = float(os.getenv('TELEGRAM_CHAT_RATE', str(20 / 60)))
+CHAT_BURST = float(os.getenv('TELEGRAM_CHAT_BURST', '20'))
+
+MAX_ATTEMPTS = 5
+BACKOFF_BASE = 1.0
+BACKOFF_MAX = 60.0
+
+# 多个来源 (线程或进程) 共用发件箱：追加和压缩互斥，同一时间只允许一个 drain
+_file_lock = locks.FileLock(OUTBOX_FILE + '.lock')
+_drain_lock = locks.FileLock(OUTBOX_FILE + '.drain.lock')
+
+
+class TokenBucket:
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = None
+
+    async def acquire(self):
+        import asyncio
+        if self.lock is None:
+            self.lock = asyncio.Lock()
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    def drain(self):
+        # 被限流后清空令牌，避免恢复时立即突发
+        self.tokens = 0
+        self.updated = time.monotonic()
+
+
+def _append(path, *records):
+    with _file_lock, open(path, 'a', encoding='utf-8') as f:
+        f.write(''.join(json.dumps(record, ensure_ascii=False) + '\n' for record in records))
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def enqueue(text, chat_id=None, parse_mode='Markdown'):
+    return enqueue_many(text, [chat_id or os.getenv('TELEGRAM_CHANNEL_ID')], parse_mode)[0]
+
+
+def enqueue_many(text, chat_ids, parse_mode='Markdown'):
+    # 同一条消息发往多个聊天：每个聊天一条记录，各自确认、重试和进入失败队列，一次写入发件箱
+    now = time.time()
+    messages = [{
+        'id': uuid.uuid4().hex,
+        'chat_id': chat_id,
+        'text': text,
+        'parse_mode': parse_mode,
+        'created': now,
+    } for chat_id in chat_ids]
+    if messages:
+        _append(OUTBOX_FILE, *messages)
+        metrics.inc('telegram_enqueued_total', len(messages))
+    return [message['id'] for message in messages]
+
+
+def load_pending():
+    # 发件箱是追加写入的日志：消息记录和 {"id", "done"} 确认记录
+    # 进程崩溃时最后一行可能不完整，直接跳过
+    pending = {}
+    try:
+        with open(OUTBOX_FILE, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                if record.get('done'):
+                    pending.pop(record['id'], None)
+                else:
+                    pending[record['id']] = record
+    except FileNotFoundError:
+        pass
+    return list(pending.values())
+
+
+def _ack(message_id):
+    _append(OUTBOX_FILE, {'id': message_id, 'done': True})
+
+
+def _compact():
+    # 把未完成的消息重写成新的发件箱，防止文件无限增长
+    with _file_lock:
+        pending = load_pending()
+        tmp_path = OUTBOX_FILE + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            for message in pending:
+                f.write(json.dumps(message, ensure_ascii=False) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, OUTBOX_FILE)
+
+
+def _backoff(attempt):
+    return min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt) * random.uniform(0.5, 1.5)
+
+
+async def _send(client, token, message, global_bucket, chat_bucket):
+    import asyncio
+
+    import httpx
+
+    url = f"{API_BASE}/bot{token}/sendMessage"
+    params = {'chat_id': message['chat_id'], 'text': message['text']}
+    if message.get('parse_mode'):
+        params['parse_mode'] = message['parse_mode']
+
+    attempt = 0
+    while attempt < MAX_ATTEMPTS:
+        await chat_bucket.acquire()
+        await global_bucket.acquire()
+        try:
+            with metrics.timer('send', 'telegram'):
+                response = await client.post(url, json=params)
+            result = response.json()
+        except (httpx.HTTPError, ValueError) as e:
+            metrics.inc('telegram_requests_total', result='error')
+            attempt += 1
+            logging.warning(f"发送消息到 Telegram 时出错 (第 {attempt} 次): {str(e)}")
+            await asyncio.sleep(_backoff(attempt))
+            continue
+
+        if result.get('ok'):
+            metrics.inc('telegram_requests_total', result='ok')
+            return True
+
+        retry_after = (result.get('parameters') or {}).get('retry_after')
+        if response.status_code == 429 or retry_after:
+            # 429 不计入重试次数，按 Telegram 给出的时间等待后再发
+            metrics.inc('telegram_requests_total', result='rate_limited')
+            retry_after = retry_after or _backoff(attempt)
+            logging.warning(f"Telegram 速率限制，{retry_after} 秒后重试")
+            await asyncio.sleep(retry_after)
+            chat_bucket.drain()
+            continue
+
+        if response.status_code == 400 and 'parse' in result.get('description', '') and 'parse_mode' in params:
+            # Markdown 解析失败时改为纯文本发送
+            logging.warning(f"Markdown 解析失败，改为纯文本发送: {result}")
+            params.pop('parse_mode')
+            continue
+
+        if 400 <= response.status_code < 500:
+            metrics.inc('telegram_requests_total', result='failed')
+            logging.error(f"发送消息到 Telegram 失败，移入失败队列: {result}")
+            _append(FAILED_FILE, {**message, 'error': result})
+            return True
+
+        metrics.inc('telegram_requests_total', result='error')
+        attempt += 1
+        logging.warning(f"发送消息到 Telegram 失败 (第 {attempt} 次): {result}")
+        await asyncio.sleep(_backoff(attempt))
+
+    return False
+
+
+async def drain():
+    # 发出发件箱中的所有消息：同一聊天按顺序发送，不同聊天并发发送
+    # 受速率限制时一次 drain 可能持续几分钟；已有 drain 在运行 (可能在别的进程中) 时直接返回，
+    # 不占着来源的租约等待，正在运行的 drain 发完一轮后会重新读取发件箱，把这里的消息一并发出
+    if not _drain_lock.acquire(blocking=False):
+        logging.info("发件箱正在由其他进程发送，跳过本次 drain")
+        return 0
+    # 本次 drain 已经处理过的消息
+    seen = set()
+    try:
+        sent = await _drain(seen)
+    finally:
+        _drain_lock.release()
+    # 最后一次读取发件箱到释放锁之间写入的消息，写入方的 drain 拿不到锁已经返回，释放后再检查一次
+    if any(message['id'] not in seen for message in load_pending()):
+        sent += await drain()
+    return sent
+
+
+async def _drain(seen):
+    import asyncio
+
+    import http_transport
+
+    token = os.getenv('TELEGRAM_BOT_TOKEN')
+    pending = load_pending()
+    if not pending:
+        return 0
+
+    global_bucket = TokenBucket(GLOBAL_RATE, GLOBAL_BURST)
+    chat_buckets = {}
+    # 本次 drain 已经处理过的消息不再重试；发送失败的聊天之后的新消息也不发，保证同一聊天的顺序
+    blocked = set()
+    sent = 0
+
+    # Telegram API 不参与录制/回放
+    async with http_transport.async_client(timeout=30, use_replay=False) as client:
+
+        async def drain_chat(chat_id, messages):
+            nonlocal sent
+            chat_bucket = chat_buckets.setdefault(chat_id, TokenBucket(CHAT_RATE, CHAT_BURST))
+            for message in messages:
+                if not await _send(client, token, message, global_bucket, chat_bucket):
+                    # 保留在发件箱中，下次 drain 时继续发送
+                    logging.error(f"消息暂时无法发送，保留在发件箱中: {message['id']}")
+                    blocked.add(chat_id)
+                    return
+                _ack(message['id'])
+                metrics.inc('telegram_delivered_total', chat=str(message['chat_id']))
+                sent += 1
+
+        # 发送期间其他来源可能继续写入发件箱 (它们的 drain 因为拿不到锁直接返回)，
+        # 每发完一轮重新读取，直到没有新消息为止
+        while pending:
+            by_chat = {}
+            for message in pending:
+                seen.add(message['id'])
+                if message['chat_id'] not in blocked:
+                    by_chat.setdefault(message['chat_id'], []).append(message)
+            await asyncio.gather(*(drain_chat(chat_id, messages) for chat_id, messages in by_chat.items()))
+            pending = [message for message in load_pending() if message['id'] not in seen]
+
+    _compact()
+    logging.info(f"发件箱已发送 {sent} 条消息，剩余 {len(load_pending())} 条")
+    return sent
+
+
+def flush():
+    if not load_pending():
+        return 0
+    import asyncio
+    return asyncio.run(drain())
@@ -0,0 +1,45 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import extractors  # noqa: E402
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmarks', 'fixtures')
+FIXTURES = {
+    'chinawriter': 'chinawriter_article.html',
+    'chinawriter_sections': 'chinawriter_section.html',
+    'wizardofodds': 'wizardofodds_blog.html',
+    'zhihu': 'zhihu.html',
+}
+# 1 字节和 7 字节的块让标签、UTF-8 字符和正则匹配都跨块断开
+CHUNK_SIZES = (1, 7, 4096, None)
+LIMITS = (None, 1, 5)
+
+
+def stream(name, content, chunk_size, limit):
+    extractor = extractors.StreamExtractor(name, limit=limit)
+    chunk_size = chunk_size or len(content)
+    for i in range(0, len(content), chunk_size):
+        if extractor.feed(content[i:i + chunk_size]):
+            break
+    return extractor.close()
+
+
+class StreamExtractorTest(unittest.TestCase):
+    def test_matches_whole_page(self):
+        # 不论怎样分块、是否限制条数，流式提取的结果都与整页提取的前 limit 条相同
+        for name, filename in FIXTURES.items():
+            with open(os.path.join(FIXTURE_DIR, filename), 'rb') as f:
+                content = f.read()
+            expected = extractors.extract(name, content)
+            self.assertGreater(len(expected), 5, name)
+            for chunk_size in CHUNK_SIZES:
+                for limit in LIMITS:
+                    with self.subTest(name=name, chunk_size=chunk_size, limit=limit):
+                        self.assertEqual(stream(name, content, chunk_size, limit), expected[:limit])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,31 @@
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import feed_writer  # noqa: E402
+
+
+class MixedTimezoneTest(unittest.TestCase):
+    def test_naive_and_aware_dates(self):
+        # 正文页补全的日期有的带时区，有的 (meta 标签、旧 RSS) 不带
+        articles = [
+            {'title': '带时区', 'link': 'https://example.com/1', 'date': '2024-09-11T08:43:00+08:00'},
+            {'title': '不带时区', 'link': 'https://example.com/2', 'date': '2024-09-10'},
+            {'title': 'RFC 2822', 'link': 'https://example.com/3', 'date': 'Mon, 09 Sep 2024 10:00:00 -0000'},
+        ]
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'feed.xml')
+            stats = feed_writer.write_feed(articles, '测试', 'https://example.com/', path)
+            self.assertTrue(stats['written'])
+            # 重新读取旧文件中的日期再合并一次
+            stats = feed_writer.write_feed(articles[:1], '测试', 'https://example.com/', path)
+            self.assertEqual(stats['items'], 3)
+        for article in articles:
+            self.assertIsNotNone(feed_writer._parse_date(article['date']).tzinfo)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,31 @@
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import sent_store  # noqa: E402
+
+
+class MigrateJsonTest(unittest.TestCase):
+    def test_truncated_file(self):
+        # 写到一半被中断的 sent_*.json：截断处之前的链接都要导入，否则会被重新发送
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'sent_articles.json')
+            with open(path, 'w') as f:
+                f.write('["https://example.com/1", "https://example.com/\\"2\\"", "https://exa')
+            store = sent_store.SentStore('test', path=os.path.join(directory, 'sent.db'))
+            try:
+                self.assertEqual(store.migrate_json(path), 2)
+                self.assertIn('https://example.com/1', store)
+                self.assertIn('https://example.com/"2"', store)
+                self.assertTrue(os.path.exists(path + '.corrupt'))
+                # 已记为导入，下次启动不再重试
+                self.assertEqual(store.migrate_json(path), 0)
+            finally:
+                store.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
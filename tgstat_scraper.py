@@ -1,13 +1,17 @@
-import requests
-from bs4 import BeautifulSoup
+import httpx
 import datetime
 import os
 from dotenv import load_dotenv
 import logging
 import json
 import time
-from requests.adapters import HTTPAdapter
-from requests.packages.urllib3.util.retry import Retry
+import timeseries
+import http_transport
+import telegram_outbox
+import digest
+import locks
+import metrics
+import routing
 
 # 加载环境变量
 load_dotenv()
@@ -15,11 +19,17 @@ load_dotenv()
 TELEGRAM_BOT_TOKEN = os.getenv('TELEGRAM_BOT_TOKEN')
 TELEGRAM_CHANNEL_ID = os.getenv('TELEGRAM_CHANNEL_ID')
 
+# 每个国家各项数字的历史样本
+HISTORY_FILE = os.getenv('TGSTAT_HISTORY_FILE', 'tgstat_history.bin')
+FIELDS = ('channels', 'groups', 'audience')
+FIELD_NAMES = {'channels': '频道数', 'groups': '群组数', 'audience': '总受众'}
+# 相对上次通知的值变化超过这个比例 (且至少为 1) 才通知
+CHANGE_THRESHOLD = float(os.getenv('TGSTAT_CHANGE_THRESHOLD', '0.01'))
+
 # 设置日志记录
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
 def fetch_tgstat_info(url):
-    session = requests.Session()
     headers = {
         'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
         'Accept': 'application/json, text/javascript, */*; q=0.01',
@@ -33,9 +43,9 @@ def fetch_tgstat_info(url):
         api_url = 'https://bam.eu01.nr-data.net/1/NRJS-7149647f3b067b4123f?a=319587756&v=1.265.1&to=MhBSZQoZWBJYUkNaXQtac0QLDFkMFlBHQx8DB19fDB1YBRZcVlpcShxeVR0A&rst=11704&ck=0&s=d462bef89f875f18&ref=https://tgstat.com/&ptid=68a98d531cd1701e&af=err,spa,xhr,stn,ins&ap=150&be=7922&fe=3291&dc=2584&at=HldRE0IDSxw%3D&fsh=0&perf=%7B%22timing%22:%7B%22of%22:1726105823044,%22n%22:0,%22u%22:7965,%22ue%22:7965,%22f%22:369,%22dn%22:369,%22dne%22:369,%22c%22:369,%22s%22:369,%22ce%22:369,%22rq%22:6890,%22rp%22:7922,%22rpe%22:7950,%22di%22:10436,%22ds%22:10437,%22de%22:10506,%22dc%22:11033,%22l%22:11033,%22le%22:11214%7D,%22navigation%22:%7B%22ty%22:1%7D%7D&timestamp=1726105835273'  # 这只是一个示例，请使用实际的URL
         
         # 如果需要POST请求，使用以下代码：
-        response = session.post(api_url, headers=headers, json=payload, timeout=30)
+        response = http_transport.client().post(api_url, headers=headers, json=payload, timeout=30)
         # 如果是GET请求，使用以下代码：
-        # response = session.get(api_url, headers=headers, timeout=30)
+        # response = http_transport.client().get(api_url, headers=headers, timeout=30)
         
         response.raise_for_status()
         logging.info(f"Successfully fetched data from {api_url}")
@@ -61,60 +71,107 @@ def fetch_tgstat_info(url):
                 logging.info(f"Country data: {country}")
         
         return countries
-    except requests.exceptions.RequestException as e:
+    except httpx.HTTPError as e:
         logging.error(f"获取 TGStat 信息时出错: {str(e)}")
         return []
 
-def send_to_telegram(info):
-    try:
-        text = "TGStat 最新统计信息:\n\n"
-        for country in info:
-            text += f"{country['name']}:\n"
-            text += f"频道数: {country['channels']}\n"
-            text += f"群组数: {country['groups']}\n"
-            text += f"总受众: {country['audience']}\n\n"
-        
-        url = f"https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}/sendMessage"
-        params = {
-            "chat_id": TELEGRAM_CHANNEL_ID,
-            "text": text,
-            "parse_mode": "Markdown"
-        }
-        response = requests.get(url, params=params)
-        result = response.json()
-        if result.get("ok"):
-            logging.info("成功发送 TGStat 信息到 Telegram")
-        else:
-            logging.error(f"发送消息到 Telegram 失败: {result}")
-    except Exception as e:
-        logging.error(f"发送消息到 Telegram 时出错: {str(e)}")
+def send_to_telegram(changes):
+    # 只发送变化超过阈值的国家和字段；国家较多时按长度上限拆成多条消息
+    # routes.json 的关键词按国家名匹配，每个聊天只收到它关注的国家
+    blocks_by_chat = {}
+    for name, fields in changes.items():
+        text = f"{digest.escape_markdown(str(name))}:"
+        for field, (old, new) in fields.items():
+            if old is None:
+                text += f"\n{FIELD_NAMES[field]}: {new}"
+            else:
+                text += f"\n{FIELD_NAMES[field]}: {old} → {new} ({new - old:+d})"
+        for chat_id in routing.chats('tgstat', str(name), default=TELEGRAM_CHANNEL_ID):
+            blocks_by_chat.setdefault(chat_id, []).append(text)
+
+    for chat_id, blocks in blocks_by_chat.items():
+        for text in digest.split_message("TGStat 最新统计信息:", blocks):
+            telegram_outbox.enqueue(text, chat_id=chat_id)
+    telegram_outbox.flush()
+    logging.info("TGStat 信息已加入 Telegram 发件箱并发送")
 
 def load_last_update():
+    # 上次通知时各国家的数字 {国家: {字段: 值}}；旧版本保存的是完整的国家列表
     try:
         with open('last_update.json', 'r') as f:
-            return json.load(f)
+            last_update = json.load(f)
     except FileNotFoundError:
-        return None
+        return {}
+    if isinstance(last_update, list):
+        last_update = {country['name']: {field: timeseries.to_int(country.get(field)) for field in FIELDS}
+                       for country in last_update}
+    return last_update
 
-def save_last_update(info):
+def save_last_update(last_update):
     with open('last_update.json', 'w') as f:
-        json.dump(info, f)
+        json.dump(last_update, f, ensure_ascii=False)
 
+def _changed(old, new):
+    return old is None or abs(new - old) >= max(1, abs(old) * CHANGE_THRESHOLD)
+
+def record_samples(info, store, now):
+    # 数字有变化时追加一个样本，返回 {国家: {字段: 当前值}}
+    current = {}
+    for country in info:
+        values = {}
+        for field in FIELDS:
+            value = timeseries.to_int(country.get(field))
+            if value is None:
+                continue
+            key = f"{country['name']}/{field}"
+            last = store.last(key)
+            if last is None or last[1] != value:
+                store.append(key, now, value)
+            values[field] = value
+        current[country['name']] = values
+    return current
+
+def diff_rows(current, last_update):
+    # 返回变化超过阈值的 {国家: {字段: (旧值, 新值)}}
+    changes = {}
+    for name, values in current.items():
+        previous = last_update.get(name, {})
+        fields = {field: (previous.get(field), value) for field, value in values.items()
+                  if _changed(previous.get(field), value)}
+        if fields:
+            changes[name] = fields
+    return changes
+
+@locks.exclusive('tgstat')
+@metrics.track_run('tgstat')
 def update_tgstat_info():
     url = 'https://tgstat.com/'
     info = fetch_tgstat_info(url)
     
     if not info:
         logging.warning("未获取到 TGStat 信息")
-        return
+        return 0
     
+    now = int(time.time())
+    store = timeseries.TimeSeriesStore(HISTORY_FILE)
+    try:
+        current = record_samples(info, store, now)
+        store.rollup(now)
+    finally:
+        store.close()
+
     last_update = load_last_update()
-    if info != last_update:
-        send_to_telegram(info)
-        save_last_update(info)
-        logging.info("TGStat 信息已更新并发送到 Telegram")
-    else:
-        logging.info("TGStat 信息未发生变化")
+    changes = diff_rows(current, last_update)
+    if not changes:
+        logging.info("TGStat 信息没有超过阈值的变化")
+        return 0
+    send_to_telegram(changes)
+    # 只更新已通知的字段，未超过阈值的小变化继续累积，直到超过阈值
+    for name, fields in changes.items():
+        last_update.setdefault(name, {}).update({field: new for field, (old, new) in fields.items()})
+    save_last_update(last_update)
+    logging.info(f"TGStat 信息已更新，{len(changes)} 个国家的变化已发送到 Telegram")
+    return 1
 
 if __name__ == "__main__":
     logging.info("脚本开始运行")
@@ -0,0 +1,213 @@
+import argparse
+import bisect
+import datetime
+import logging
+import os
+from array import array
+
+# 紧凑的只追加时间序列：每条序列的时间戳和数值存在 array 列中，
+# 文件里每个样本只记录与上一个样本的差值 (zigzag + varint)，数值不变时一个样本约 3 字节。
+# 超过 ROLLUP_AGE 的旧样本按 ROLLUP_INTERVAL 合并为每段一个 (保留段内最后一个值)。
+
+HISTORY_FILE = os.getenv('TIMESERIES_FILE', 'timeseries.bin')
+ROLLUP_AGE = int(os.getenv('TIMESERIES_ROLLUP_AGE', str(7 * 86400)))
+ROLLUP_INTERVAL = int(os.getenv('TIMESERIES_ROLLUP_INTERVAL', '86400'))
+
+_DEFINE = 0
+_SAMPLE = 1
+
+
+def _write_varint(buffer, value):
+    while value > 0x7f:
+        buffer.append(value & 0x7f | 0x80)
+        value >>= 7
+    buffer.append(value)
+
+
+def _read_varint(data, pos):
+    result = shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        result |= (byte & 0x7f) << shift
+        if byte < 0x80:
+            return result, pos
+        shift += 7
+
+
+def _zigzag(value):
+    return value * 2 if value >= 0 else -value * 2 - 1
+
+
+def _unzigzag(value):
+    return value >> 1 if not value & 1 else -(value >> 1) - 1
+
+
+def to_int(value):
+    # 接口返回的数字可能是字符串 ("12,345")；无法识别时返回 None
+    if isinstance(value, int):
+        return value
+    try:
+        return int(float(str(value).replace(',', '').replace(' ', '')))
+    except (TypeError, ValueError):
+        return None
+
+
+class Series:
+    def __init__(self, series_id, key):
+        self.id = series_id
+        self.key = key
+        self.times = array('q')
+        self.values = array('q')
+
+
+class TimeSeriesStore:
+    def __init__(self, path=HISTORY_FILE):
+        self.path = path
+        self.series = {}
+        self._by_id = []
+        self._load()
+        self.file = open(path, 'ab')
+
+    def _load(self):
+        try:
+            with open(self.path, 'rb') as f:
+                data = f.read()
+        except FileNotFoundError:
+            return
+        pos = good = 0
+        try:
+            while pos < len(data):
+                tag = data[pos]
+                series_id, pos = _read_varint(data, pos + 1)
+                if tag == _DEFINE:
+                    length, pos = _read_varint(data, pos)
+                    if pos + length > len(data):
+                        raise IndexError
+                    key = data[pos:pos + length].decode('utf-8')
+                    pos += length
+                    series = Series(series_id, key)
+                    self.series[key] = series
+                    self._by_id.append(series)
+                else:
+                    series = self._by_id[series_id]
+                    delta_time, pos = _read_varint(data, pos)
+                    delta_value, pos = _read_varint(data, pos)
+                    last_time = series.times[-1] if series.times else 0
+                    last_value = series.values[-1] if series.values else 0
+                    series.times.append(last_time + _unzigzag(delta_time))
+                    series.values.append(last_value + _unzigzag(delta_value))
+                good = pos
+        except IndexError:
+            # 上次写到一半被中断，丢弃不完整的最后一条记录
+            logging.warning(f"{self.path} 末尾有 {len(data) - good} 字节不完整的记录，已截断")
+            with open(self.path, 'r+b') as f:
+                f.truncate(good)
+
+    def _encode_define(self, buffer, series):
+        name = series.key.encode('utf-8')
+        buffer.append(_DEFINE)
+        _write_varint(buffer, series.id)
+        _write_varint(buffer, len(name))
+        buffer.extend(name)
+
+    @staticmethod
+    def _encode_sample(buffer, series_id, delta_time, delta_value):
+        buffer.append(_SAMPLE)
+        _write_varint(buffer, series_id)
+        _write_varint(buffer, _zigzag(delta_time))
+        _write_varint(buffer, _zigzag(delta_value))
+
+    def append(self, key, timestamp, value):
+        # 时间戳必须不早于该序列的最后一个样本
+        buffer = bytearray()
+        series = self.series.get(key)
+        if series is None:
+            series = self.series[key] = Series(len(self._by_id), key)
+            self._by_id.append(series)
+            self._encode_define(buffer, series)
+        last_time = series.times[-1] if series.times else 0
+        last_value = series.values[-1] if series.values else 0
+        if timestamp < last_time:
+            raise ValueError(f"{key} 的时间戳 {timestamp} 早于最后一个样本 {last_time}")
+        self._encode_sample(buffer, series.id, timestamp - last_time, value - last_value)
+        series.times.append(timestamp)
+        series.values.append(value)
+        self.file.write(buffer)
+        self.file.flush()
+
+    def keys(self):
+        return list(self.series)
+
+    def last(self, key):
+        series = self.series.get(key)
+        if series is None or not series.times:
+            return None
+        return series.times[-1], series.values[-1]
+
+    def range(self, key, start=None, end=None):
+        # 返回时间戳在 [start, end) 内的 (timestamp, value) 列表
+        series = self.series.get(key)
+        if series is None:
+            return []
+        lo = 0 if start is None else bisect.bisect_left(series.times, start)
+        hi = len(series.times) if end is None else bisect.bisect_left(series.times, end)
+        return list(zip(series.times[lo:hi], series.values[lo:hi]))
+
+    def rollup(self, now, age=ROLLUP_AGE, interval=ROLLUP_INTERVAL):
+        # 把早于 now - age 的样本合并为每 interval 秒一个；有样本被合并时重写文件，返回合并掉的样本数
+        cutoff = now - age
+        removed = 0
+        for series in self.series.values():
+            old = bisect.bisect_left(series.times, cutoff)
+            times, values = array('q'), array('q')
+            for i in range(old):
+                if i + 1 < old and series.times[i + 1] // interval == series.times[i] // interval:
+                    continue
+                times.append(series.times[i])
+                values.append(series.values[i])
+            if len(times) < old:
+                removed += old - len(times)
+                series.times = times + series.times[old:]
+                series.values = values + series.values[old:]
+        if removed:
+            self._rewrite()
+            logging.info(f"{self.path}: 合并了 {removed} 个旧样本")
+        return removed
+
+    def _rewrite(self):
+        buffer = bytearray()
+        for series in self._by_id:
+            self._encode_define(buffer, series)
+            last_time = last_value = 0
+            for timestamp, value in zip(series.times, series.values):
+                self._encode_sample(buffer, series.id, timestamp - last_time, value - last_value)
+                last_time, last_value = timestamp, value
+        self.file.close()
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(buffer)
+        os.replace(tmp_path, self.path)
+        self.file = open(self.path, 'ab')
+
+    def close(self):
+        self.file.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='导出时间序列为 CSV')
+    parser.add_argument('key', nargs='?', help='序列名，省略时列出所有序列')
+    parser.add_argument('--file', default=HISTORY_FILE)
+    parser.add_argument('--days', type=float, help='只导出最近若干天')
+    args = parser.parse_args()
+    store = TimeSeriesStore(args.file)
+    if args.key is None:
+        for key in store.keys():
+            print(key)
+    else:
+        start = None
+        if args.days:
+            start = int(datetime.datetime.now().timestamp() - args.days * 86400)
+        for timestamp, value in store.range(args.key, start):
+            print(f"{datetime.datetime.fromtimestamp(timestamp).isoformat()},{value}")
+    store.close()
@@ -1,11 +1,17 @@
-import requests
-from bs4 import BeautifulSoup
 import datetime
 import os
 from dotenv import load_dotenv
 import logging
-import json
-import time
+import http_cache
+import extractors
+import telegram_outbox
+import digest
+import fingerprint
+import paginator
+import sent_store
+import locks
+import metrics
+import routing
 
 # 加载环境变量
 load_dotenv()
@@ -16,26 +22,17 @@ TELEGRAM_CHANNEL_ID = os.getenv('TELEGRAM_CHANNEL_ID')
 # 设置日志记录
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
+BLOG_URL = 'https://wizardofodds.com/blog/'  # Wizard of Odds 博客页面
+
 def fetch_wizardofodds_articles(url):
     try:
         headers = {
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
         }
-        response = requests.get(url, headers=headers, timeout=30)
-        response.raise_for_status()
-        soup = BeautifulSoup(response.text, 'html.parser')
-        
-        articles = []
-        for article in soup.find_all('article', class_='post'):
-            title = article.find('h2', class_='entry-title').text.strip()
-            link = article.find('a', class_='entry-title-link')['href']
-            date = article.find('time', class_='entry-time')['datetime']
-            
-            articles.append({
-                'title': title,
-                'link': link,
-                'date': date
-            })
+        # 边下载边扫描，main.content 闭合后不再读取页面余下的部分，只解析 article.post 区域
+        articles = http_cache.fetch_stream(url, extractors.StreamExtractor('wizardofodds'), headers=headers, timeout=30)
+        if articles is None:
+            return None
         
         if not articles:
             logging.warning(f"未在 {url} 找到任何文章")
@@ -50,51 +47,61 @@ def fetch_wizardofodds_articles(url):
         return []
 
 def send_to_telegram(article):
-    try:
-        text = f"*{article['title']}*\n\n{article['link']}\n\n发布日期: {article['date']}"
-        url = f"https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}/sendMessage"
-        params = {
-            "chat_id": TELEGRAM_CHANNEL_ID,
-            "text": text,
-            "parse_mode": "Markdown"
-        }
-        response = requests.get(url, params=params)
-        result = response.json()
-        if result.get("ok"):
-            logging.info(f"成功发送文章到 Telegram: {article['title']}")
-        else:
-            logging.error(f"发送消息到 Telegram 失败: {result}")
-    except Exception as e:
-        logging.error(f"发送消息到 Telegram 时出错: {str(e)}")
+    if fingerprint.is_duplicate('wizardofodds', article['title'], article['link']):
+        return
+    chat_ids = routing.chats('wizardofodds', article['title'], default=TELEGRAM_CHANNEL_ID)
+    if not chat_ids:
+        return
+    # 摘要模式下先攒起来，由 digest.flush() 合并成少量消息
+    if digest.ENABLED:
+        digest.add('wizardofodds', 'Wizard of Odds', article['title'], article['link'], article['date'],
+                   chat_ids=chat_ids)
+        return
+    # 写入发件箱，由 telegram_outbox.flush() 统一按速率限制发送
+    text = (f"{digest.bold(article['title'])}\n\n{digest.escape_markdown(article['link'])}\n\n"
+            f"发布日期: {digest.escape_markdown(article['date'])}")
+    telegram_outbox.enqueue_many(text, chat_ids)
+    logging.info(f"已加入 Telegram 发件箱 ({len(chat_ids)} 个聊天): {article['title']}")
 
 def load_sent_articles():
-    try:
-        with open('sent_wizardofodds_articles.json', 'r') as f:
-            return set(json.load(f))
-    except FileNotFoundError:
-        return set()
+    # 发送记录保存在 SQLite 中，首次运行时导入旧的 sent_wizardofodds_articles.json
+    sent_articles = sent_store.SentStore('wizardofodds')
+    sent_articles.migrate_json('sent_wizardofodds_articles.json')
+    return sent_articles
 
-def save_sent_articles(sent_articles):
-    with open('sent_wizardofodds_articles.json', 'w') as f:
-        json.dump(list(sent_articles), f)
+def blog_page_url(page):
+    # 博客归档页：/blog/、/blog/page/2/、/blog/page/3/ ...
+    return BLOG_URL if page == 1 else f"{BLOG_URL}page/{page}/"
 
+@locks.exclusive('wizardofodds')
+@metrics.track_run('wizardofodds')
 def update_articles():
     sent_articles = load_sent_articles()
-    new_sent_articles = set()
+    new_sent_articles = []
+    fetched = 0
 
-    url = 'https://wizardofodds.com/blog/'  # Wizard of Odds 博客页面
-    articles = fetch_wizardofodds_articles(url)
-    
-    for article in articles:
-        if article['link'] not in sent_articles:
-            send_to_telegram(article)
-            new_sent_articles.add(article['link'])
-            time.sleep(5)  # 添加延迟以避免触发 Telegram 的速率限制
+    # 第一页有新文章时继续往后翻页补抓；首次运行 (还没有发送记录) 只看第一页
+    max_pages = paginator.MAX_PAGES if sent_articles else 1
+    pages = paginator.crawl(blog_page_url, fetch_wizardofodds_articles,
+                            lambda link: link in sent_articles, max_pages)
+    for articles in pages:
+        fetched += len(articles)
+        for article in articles:
+            if article['link'] not in sent_articles:
+                send_to_telegram(article)
+                sent_articles.add(article['link'])
+                new_sent_articles.append(article['link'])
     
-    logging.info(f"获取到 {len(articles)} 篇文章，发送了 {len(new_sent_articles)} 篇新文章到 Telegram")
+    logging.info(f"获取到 {fetched} 篇文章，发送了 {len(new_sent_articles)} 篇新文章到 Telegram")
+    # 全部处理完才保存 ETag；后面的归档页不保存，需要补抓时总是完整请求
+    http_cache.commit([blog_page_url(1)])
 
-    sent_articles.update(new_sent_articles)
-    save_sent_articles(sent_articles)
+    metrics.inc('scraper_new_items_total', len(new_sent_articles), source='wizardofodds')
+    sent_articles.prune()
+    sent_articles.close()
+    digest.flush(chat_id=TELEGRAM_CHANNEL_ID)
+    telegram_outbox.flush()
+    return len(new_sent_articles)
 
 if __name__ == "__main__":
     logging.info("脚本开始运行")
@@ -1,9 +1,15 @@
 import os
-import requests
-from bs4 import BeautifulSoup
 import time
-from telegram import Bot
 from dotenv import load_dotenv
+import http_cache
+import extractors
+import telegram_outbox
+import digest
+import fingerprint
+import sent_store
+import locks
+import metrics
+import routing
 
 # 加载 .env 文件
 load_dotenv()
@@ -12,42 +18,54 @@ load_dotenv()
 TELEGRAM_BOT_TOKEN = os.getenv('TELEGRAM_BOT_TOKEN')
 TELEGRAM_CHANNEL_ID = os.getenv('TELEGRAM_CHANNEL_ID')
 
-bot = Bot(token=TELEGRAM_BOT_TOKEN)
+ZHIHU_URL = 'https://www.zhihu.com/'
 
 def fetch_zhihu_updates():
-    url = 'https://www.zhihu.com/'
-    response = requests.get(url)
-    soup = BeautifulSoup(response.content, 'html.parser')
-    
-    updates = []
-    for item in soup.select('.ContentItem'):
-        title = item.select_one('.ContentItem-title').text.strip()
-        link = item.select_one('a')['href']
-        if not link.startswith('http'):
-            link = 'https://www.zhihu.com' + link
-        updates.append({'title': title, 'link': link})
-    
-    return updates
+    # 推荐列表 (.Topstory-recommend) 结束后不再读取页面余下的部分，只解析 .ContentItem 区域
+    return http_cache.fetch_stream(ZHIHU_URL, extractors.StreamExtractor('zhihu')) or []
 
 def send_to_telegram(update):
-    message = f"*{update['title']}*\n\n{update['link']}"
-    bot.send_message(chat_id=TELEGRAM_CHANNEL_ID, text=message, parse_mode='Markdown')
+    # 知乎以 标题|链接 去重，同一内容换了链接或标题略改时靠指纹识别
+    if fingerprint.is_duplicate('zhihu', update['title'], update['link']):
+        return
+    chat_ids = routing.chats('zhihu', update['title'], default=TELEGRAM_CHANNEL_ID)
+    if not chat_ids:
+        return
+    if digest.ENABLED:
+        digest.add('zhihu', '知乎', update['title'], update['link'], chat_ids=chat_ids)
+        return
+    message = f"{digest.bold(update['title'])}\n\n{digest.escape_markdown(update['link'])}"
+    telegram_outbox.enqueue_many(message, chat_ids)
+
+@locks.exclusive('zhihu')
+@metrics.track_run('zhihu')
+def check_updates(last_updates=None):
+    # 抓取一次并发送新内容，返回新内容条数
+    # 只保留最近 1000 条记录，最旧的先淘汰
+    store = last_updates if last_updates is not None else sent_store.SentStore('zhihu', max_items=1000)
+    new_count = 0
+    current_updates = fetch_zhihu_updates()
+    for update in current_updates:
+        update_key = f"{update['title']}|{update['link']}"
+        if update_key not in store:
+            send_to_telegram(update)
+            store.add(update_key)
+            new_count += 1
+    # 新内容都写入发送记录后才保存 ETag
+    http_cache.commit([ZHIHU_URL])
+    metrics.inc('scraper_new_items_total', new_count, source='zhihu')
+    digest.flush(chat_id=TELEGRAM_CHANNEL_ID)
+    telegram_outbox.flush()
+    store.prune()
+    if last_updates is None:
+        store.close()
+    return new_count
 
 def main():
-    last_updates = set()
+    last_updates = sent_store.SentStore('zhihu', max_items=1000)
     while True:
         try:
-            current_updates = fetch_zhihu_updates()
-            for update in current_updates:
-                update_key = f"{update['title']}|{update['link']}"
-                if update_key not in last_updates:
-                    send_to_telegram(update)
-                    last_updates.add(update_key)
-            
-            # 保持最近100条更新
-            if len(last_updates) > 100:
-                last_updates = set(list(last_updates)[-100:])
-            
+            check_updates(last_updates)
             time.sleep(10)  # 每5分钟检查一次
         except Exception as e:
             print(f"发生错误: {str(e)}")